@@ -0,0 +1,172 @@
+"""Нагрузочное сравнение синхронного API под WSGI и асинхронного под ASGI
+
+Создаёт временную базу с пользователем и привычками, запускает gunicorn с
+синхронными воркерами и uvicorn с тем же числом воркеров и замеряет
+запросы в секунду и задержки (p50, p99) списка привычек, просмотра привычки
+и ленты публичных привычек при заданном числе одновременных клиентов.
+
+Запуск: python -m benchmarks.async_api --workers 4 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from statistics import quantiles
+
+from benchmarks.utils import benchmark_database, setup_django
+
+SERVERS = {
+    "wsgi": (
+        "gunicorn",
+        "habit_reminder.wsgi:application",
+        "--workers",
+        "{workers}",
+        "--bind",
+        "127.0.0.1:{port}",
+    ),
+    "asgi": (
+        "uvicorn",
+        "habit_reminder.asgi:application",
+        "--workers",
+        "{workers}",
+        "--port",
+        "{port}",
+        "--no-access-log",
+    ),
+}
+
+ENDPOINTS = {
+    "wsgi": ("/habits/", "/habits/{pk}/", "/habits/public/"),
+    "asgi": ("/habits/async/", "/habits/async/{pk}/", "/habits/async/public/"),
+}
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, workers, port, database):
+    command = [arg.format(workers=workers, port=port) for arg in SERVERS[name]]
+    env = {**os.environ, "DB_NAME": database, "DEBUG": "False"}
+    return subprocess.Popen(
+        [sys.executable, "-m", *command],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_for_server(client, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def load(base_url, paths, headers, requests, concurrency):
+    """Отправляет запросы по кругу и возвращает (запросов/с, задержки в мс)"""
+    import httpx
+
+    latencies = []
+    queue = asyncio.Queue()
+    for number in range(requests):
+        queue.put_nowait(paths[number % len(paths)])
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=60
+    ) as client:
+        await wait_for_server(client, paths[0])
+
+        async def worker():
+            while not queue.empty():
+                path = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return requests / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--habits", type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from datetime import time as habit_time
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from habits.models import Habit
+
+    with benchmark_database():
+        user = get_user_model().objects.create(username="user")
+        habits = Habit.objects.bulk_create(
+            Habit(
+                user=user,
+                place="Парк",
+                time=habit_time(7),
+                action="Бегать",
+                duration=60,
+                is_public=number % 2 == 0,
+            )
+            for number in range(args.habits)
+        )
+        headers = {
+            "Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"
+        }
+        database = connection.settings_dict["NAME"]
+        # Серверы подключаются к базе сами
+        connection.close()
+
+        print(
+            f"{'сервер':>6} {'воркеров':>9} {'клиентов':>9} "
+            f"{'запросов/с':>11} {'p50, мс':>8} {'p99, мс':>8}"
+        )
+        for name in SERVERS:
+            port = get_free_port()
+            server = start_server(name, args.workers, port, database)
+            try:
+                paths = [path.format(pk=habits[0].pk) for path in ENDPOINTS[name]]
+                rps, latencies = asyncio.run(
+                    load(
+                        f"http://127.0.0.1:{port}",
+                        paths,
+                        headers,
+                        args.requests,
+                        args.concurrency,
+                    )
+                )
+            finally:
+                server.terminate()
+                server.wait()
+            percentiles = quantiles(latencies, n=100)
+            print(
+                f"{name:>6} {args.workers:>9} {args.concurrency:>9} "
+                f"{rps:>11.0f} {percentiles[49]:>8.1f} {percentiles[98]:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
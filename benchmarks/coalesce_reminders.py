@@ -0,0 +1,53 @@
+"""Число запросов к Telegram за один запуск с объединением напоминаний и без него
+
+Привычки распределяются между пользователями по закону Ципфа: у немногих
+пользователей много привычек на одну минуту, у большинства - одна.
+
+Запуск: python -m benchmarks.coalesce_reminders --habits 100000 --users 20000
+"""
+
+import argparse
+import random
+from time import perf_counter
+
+from habits.services import coalesce_messages
+
+
+def generate_messages(habits, users, skew, seed):
+    rng = random.Random(seed)
+    weights = [1 / rank**skew for rank in range(1, users + 1)]
+    chats = rng.choices(range(users), weights=weights, k=habits)
+    return [
+        {
+            "text": f"Я буду делать зарядку №{number} в 07:00 в парке",
+            "tg_chat_id": str(chat),
+            "scheduled_at": 0.0,
+        }
+        for number, chat in enumerate(chats)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    messages = generate_messages(args.habits, args.users, args.skew, args.seed)
+    started = perf_counter()
+    coalesced = coalesce_messages(messages)
+    elapsed = perf_counter() - started
+
+    print(f"Напоминаний: {len(messages)}")
+    print(f"Запросов без объединения: {len(messages)}")
+    print(
+        f"Запросов с объединением: {len(coalesced)} "
+        f"({len(coalesced) / len(messages):.1%}), "
+        f"объединение заняло {elapsed * 1000:.1f} мс"
+    )
+
+
+if __name__ == "__main__":
+    main()
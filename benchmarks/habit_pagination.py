@@ -0,0 +1,96 @@
+"""Стоимость первой и глубокой страницы списка привычек
+
+Заполняет временную базу привычками одного пользователя и замеряет запрос
+первой и N-й страницы списка с пагинацией по номерам страниц и по курсору.
+У курсора время не должно зависеть от глубины страницы.
+
+Запуск: python -m benchmarks.habit_pagination --habits 100000 --page 10000
+"""
+
+import argparse
+from datetime import time
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.utils import benchmark_database, measure, setup_django
+
+
+def seed(habits):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    from habits.models import Habit
+
+    user = get_user_model().objects.create(username="user")
+    Habit.objects.bulk_create(
+        (
+            Habit(user=user, place="Парк", time=time(7), action="Бегать", duration=60)
+            for _ in range(habits)
+        ),
+        batch_size=5000,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {Habit._meta.db_table}")
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.pagination import Cursor, PageNumberPagination
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from habits.models import Habit
+    from habits.paginators import HabitCursorPagination
+    from habits.views import HabitViewSet
+
+    factory = APIRequestFactory()
+
+    def request_page(pagination_class, params):
+        view = HabitViewSet.as_view({"get": "list"}, pagination_class=pagination_class)
+
+        def run():
+            request = factory.get("/habits/", params)
+            force_authenticate(request, user=user)
+            response = view(request)
+            assert response.status_code == 200, response.status_code
+            response.render()
+
+        return run
+
+    def cursor_params(page):
+        if page == 1:
+            return {}
+        paginator = HabitCursorPagination()
+        paginator.base_url = "/habits/"
+        position = (
+            Habit.objects.filter(user=user)
+            .order_by("id")
+            .values_list("id", flat=True)[(page - 1) * api_settings.PAGE_SIZE - 1]
+        )
+        url = paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+        return {"cursor": parse_qs(urlsplit(url).query)["cursor"][0]}
+
+    with benchmark_database():
+        user = seed(args.habits)
+        print(f"{'пагинация':>12} {'страница':>10} {'запрос, мс':>12}")
+        for name, pagination_class, params in (
+            ("page", PageNumberPagination, lambda page: {"page": page}),
+            ("cursor", HabitCursorPagination, cursor_params),
+        ):
+            for page in (1, args.page):
+                elapsed = measure(
+                    request_page(pagination_class, params(page)), args.repeat
+                )
+                print(f"{name:>12} {page:>10} {elapsed * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
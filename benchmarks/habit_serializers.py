@@ -0,0 +1,71 @@
+"""Скорость сериализации списка привычек: HabitSerializer и HabitListSerializer
+
+Строит в памяти страницу привычек и замеряет, сколько строк в секунду
+проходит сериализацию и рендеринг в JSON каждым из способов. База не нужна.
+
+Запуск: python -m benchmarks.habit_serializers --rows 1000
+"""
+
+import argparse
+from datetime import time
+
+from benchmarks.utils import measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+
+    from habits.models import Habit
+    from habits.renderers import ORJSONRenderer
+    from habits.serializers import HabitListSerializer, HabitSerializer
+
+    habits = [
+        Habit(
+            id=number,
+            user_id=number % 100,
+            place="Парк",
+            time=time(7, number % 60),
+            action=f"Бегать №{number}",
+            duration=60,
+            periodicity_type=Habit.Periodicity.WEEKLY,
+            weekdays=[1, 3, 5],
+            reward="Кофе" if number % 2 else None,
+        )
+        for number in range(1, args.rows + 1)
+    ]
+    rows = [
+        {column: getattr(habit, column) for column in HabitListSerializer.columns}
+        for habit in habits
+    ]
+    assert JSONRenderer().render(
+        HabitSerializer(habits, many=True).data
+    ) == ORJSONRenderer().render(HabitListSerializer().serialize(rows))
+
+    cases = (
+        (
+            "HabitSerializer + JSONRenderer",
+            lambda: JSONRenderer().render(HabitSerializer(habits, many=True).data),
+        ),
+        (
+            "HabitListSerializer + JSONRenderer",
+            lambda: JSONRenderer().render(HabitListSerializer().serialize(rows)),
+        ),
+        (
+            "HabitListSerializer + ORJSONRenderer",
+            lambda: ORJSONRenderer().render(HabitListSerializer().serialize(rows)),
+        ),
+    )
+    print(f"{'способ':>40} {'строк/с':>12}")
+    for name, func in cases:
+        elapsed = measure(func, args.repeat)
+        print(f"{name:>40} {args.rows / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Скорость аутентифицированных запросов с кэшем пользователей и без него
+
+Создаёт во временной базе пользователя с привычками и замеряет, сколько
+запросов к списку привычек в секунду обслуживается с JWTAuthentication и с
+CachedJWTAuthentication.
+
+Запуск: python -m benchmarks.jwt_auth --requests 2000
+"""
+
+import argparse
+from datetime import time
+
+from benchmarks.utils import benchmark_database, measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from habits.models import Habit
+    from habits.views import HabitViewSet
+    from users.authentication import CachedJWTAuthentication
+
+    factory = APIRequestFactory()
+
+    def serve(authentication_class, authorization):
+        view = HabitViewSet.as_view(
+            {"get": "list"}, authentication_classes=(authentication_class,)
+        )
+
+        def run():
+            for _ in range(args.requests):
+                request = factory.get("/habits/", HTTP_AUTHORIZATION=authorization)
+                response = view(request)
+                assert response.status_code == 200, response.status_code
+                response.render()
+
+        return run
+
+    with benchmark_database():
+        user = get_user_model().objects.create(username="user")
+        Habit.objects.bulk_create(
+            Habit(user=user, place="Парк", time=time(7), action="Бегать", duration=60)
+            for _ in range(5)
+        )
+        authorization = f"Bearer {RefreshToken.for_user(user).access_token}"
+
+        print(f"{'аутентификация':>24} {'запросов/с':>12}")
+        for authentication_class in (JWTAuthentication, CachedJWTAuthentication):
+            elapsed = measure(serve(authentication_class, authorization), args.repeat)
+            print(
+                f"{authentication_class.__name__:>24} {args.requests / elapsed:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
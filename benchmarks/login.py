@@ -0,0 +1,72 @@
+"""Пропускная способность входа при разных политиках хеширования паролей
+
+Создаёт во временной базе пользователя и замеряет, сколько запросов к
+TokenObtainPairView в секунду обслуживается с PBKDF2 и с Argon2 при заданном
+числе одновременных потоков-воркеров.
+
+Запуск: python -m benchmarks.login --requests 200 --concurrency 8
+"""
+
+import argparse
+from threading import Thread
+
+from benchmarks.utils import benchmark_database, measure, setup_django
+
+POLICIES = {
+    "pbkdf2": ["django.contrib.auth.hashers.PBKDF2PasswordHasher"],
+    "argon2": ["users.hashers.Argon2PasswordHasher"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.views import TokenObtainPairView
+
+    factory = APIRequestFactory()
+    view = TokenObtainPairView.as_view()
+    data = {"username": "user", "password": "12345678"}
+
+    def worker(count):
+        try:
+            for _ in range(count):
+                request = factory.post("/auth/login/", data, format="json")
+                response = view(request)
+                assert response.status_code == 200, response.status_code
+        finally:
+            connection.close()
+
+    def run():
+        per_worker = args.requests // args.concurrency
+        threads = [
+            Thread(target=worker, args=(per_worker,)) for _ in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    with benchmark_database():
+        user = get_user_model().objects.create(username="user")
+        requests = args.requests // args.concurrency * args.concurrency
+
+        print(f"{'хешер':>8} {'потоков':>8} {'входов/с':>10}")
+        for name, hashers in POLICIES.items():
+            with override_settings(PASSWORD_HASHERS=hashers):
+                user.set_password(data["password"])
+                user.save(update_fields=["password"])
+                elapsed = measure(run, args.repeat)
+            print(f"{name:>8} {args.concurrency:>8} {requests / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
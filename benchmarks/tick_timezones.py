@@ -0,0 +1,90 @@
+"""Стоимость одного запуска планировщика в зависимости от числа привычек и часовых поясов
+
+Для каждой комбинации заполняет временную базу привычками со случайным
+временем, раскладывает пользователей по часовым поясам и замеряет выборку
+наступивших напоминаний. Время должно расти с числом часовых поясов, а не
+с числом привычек.
+
+Запуск: python -m benchmarks.tick_timezones --habits 10000 100000 --zones 1 10 50
+"""
+
+import argparse
+import random
+from datetime import datetime, time, timezone
+from zoneinfo import available_timezones
+
+from benchmarks.utils import benchmark_database, measure, setup_django
+
+
+def seed(habits, zones, users, rng):
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.db import connection
+
+    from habits.models import Habit, ReminderSlot
+    from habits.schedule import rebuild_schedule
+
+    User = get_user_model()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"TRUNCATE {Habit._meta.db_table}, {User._meta.db_table} CASCADE"
+        )
+    names = sorted(available_timezones())[:zones]
+    created_users = User.objects.bulk_create(
+        User(
+            username=f"user-{number}",
+            tg_chat_id=str(number),
+            timezone=names[number % len(names)],
+        )
+        for number in range(users)
+    )
+    Habit.objects.bulk_create(
+        (
+            Habit(
+                user=rng.choice(created_users),
+                place="Парк",
+                time=time(rng.randrange(24), rng.randrange(60)),
+                action="Бегать",
+                duration=60,
+            )
+            for _ in range(habits)
+        ),
+        batch_size=5000,
+    )
+    rebuild_schedule()
+    cache.clear()
+    return ReminderSlot.objects.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--habits", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--zones", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import transaction
+
+    from habits.tasks import record_due_reminders
+
+    moment = datetime(2024, 12, 2, 7, 30, tzinfo=timezone.utc)
+
+    def tick():
+        with transaction.atomic():
+            record_due_reminders(moment)
+            transaction.set_rollback(True)
+
+    rng = random.Random(0)
+    with benchmark_database():
+        print(f"{'привычек':>10} {'поясов':>8} {'слотов':>10} {'запуск, мс':>12}")
+        for habits in args.habits:
+            for zones in args.zones:
+                slots = seed(habits, zones, args.users, rng)
+                elapsed = measure(tick, args.repeat)
+                print(f"{habits:>10} {zones:>8} {slots:>10} {elapsed * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+from contextlib import contextmanager
+from statistics import median
+from time import perf_counter
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "habit_reminder.settings")
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """Создаёт отдельную тестовую базу на время замера и удаляет её после"""
+    from django.db import connection
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, repeat=5):
+    """Медианное время выполнения func в секундах"""
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+    return median(timings)
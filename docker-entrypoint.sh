@@ -0,0 +1,11 @@
+#!/bin/sh
+set -e
+
+# Файлы метрик остаются от процессов прошлого запуска: без очистки их
+# счётчики попадали бы в /metrics, а каталог бы только рос
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+exec "$@"
@@ -8,3 +8,6 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "habit_reminder.settings")
 app = Celery("habit_reminder")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+# Подключает сигналы Celery и учёт запросов к базе для метрик задач
+import habit_reminder.metrics  # noqa: E402, F401
@@ -0,0 +1,26 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def get_pool_metrics(alias=DEFAULT_DB_ALIAS):
+    """Метрики пула соединений текущего процесса
+
+    checkout_wait_ms - суммарное время ожидания свободного соединения,
+    checkout_timeouts - число запросов, не дождавшихся соединения,
+    saturation - доля соединений пула, выданных в работу.
+    """
+    pool = connections[alias].pool
+    if pool is None:
+        return {}
+    stats = pool.get_stats()
+    in_use = stats["pool_size"] - stats["pool_available"]
+    return {
+        "size": stats["pool_size"],
+        "max_size": stats["pool_max"],
+        "in_use": in_use,
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": stats.get("requests_num", 0),
+        "checkout_wait_ms": stats.get("requests_wait_ms", 0),
+        "checkout_timeouts": stats.get("requests_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+        "saturation": in_use / stats["pool_max"],
+    }
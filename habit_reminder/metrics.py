@@ -0,0 +1,192 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Histogram,
+                               multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+# Метки: kind - request или task, name - метод и маршрут запроса или имя задачи
+LABELS = ("kind", "name")
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+DURATION = Histogram(
+    "habit_reminder_duration_seconds", "Полное время выполнения", LABELS
+)
+DB_QUERIES = Histogram(
+    "habit_reminder_db_queries",
+    "Число запросов к базе",
+    LABELS,
+    buckets=QUERY_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "habit_reminder_db_duration_seconds", "Время запросов к базе", LABELS
+)
+SERIALIZER_DURATION = Histogram(
+    "habit_reminder_serializer_duration_seconds",
+    "Время сериализаторов и рендеринга ответа",
+    LABELS,
+)
+HTTP_DURATION = Histogram(
+    "habit_reminder_http_duration_seconds", "Время исходящих HTTP-запросов", LABELS
+)
+
+REMINDERS_DUE = Counter(
+    "habit_reminder_reminders_due", "Напоминания, поставленные в очередь тиками"
+)
+REMINDERS_SENT = Counter("habit_reminder_reminders_sent", "Отправленные сообщения")
+REMINDERS_FAILED = Counter(
+    "habit_reminder_reminders_failed", "Сообщения, которые не удалось отправить"
+)
+REMINDERS_DEFERRED = Counter(
+    "habit_reminder_reminders_deferred", "Сообщения, отложенные из-за лимитов"
+)
+DELIVERY_LAG = Histogram(
+    "habit_reminder_delivery_lag_seconds",
+    "Задержка отправки относительно запланированного времени",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+_trace = ContextVar("trace", default=None)
+_tasks = {}
+
+
+class Trace:
+    """Время, накопленное запросом или задачей по видам работы"""
+
+    __slots__ = ("queries", "db", "serializer", "http")
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.http = 0.0
+
+
+def start_trace():
+    return _trace.set(Trace()), perf_counter()
+
+
+def finish_trace(token, started, kind, name):
+    """Записывает в гистограммы замеры запроса или задачи"""
+    elapsed = perf_counter() - started
+    trace = _trace.get()
+    _trace.reset(token)
+    labels = (kind, name)
+    DURATION.labels(*labels).observe(elapsed)
+    DB_QUERIES.labels(*labels).observe(trace.queries)
+    DB_DURATION.labels(*labels).observe(trace.db)
+    SERIALIZER_DURATION.labels(*labels).observe(trace.serializer)
+    HTTP_DURATION.labels(*labels).observe(trace.http)
+
+
+@contextmanager
+def timed(kind):
+    """Добавляет время выполнения блока к текущему замеру (serializer или http)"""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        setattr(trace, kind, getattr(trace, kind) + perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.queries += 1
+        trace.db += perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Подключает учёт запросов к каждому соединению с базой
+
+    Обёртка читает замер из контекста, поэтому учитывает и запросы
+    асинхронного ORM, выполняемые в других потоках.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@task_prerun.connect
+def start_task_trace(task_id, task, **kwargs):
+    _tasks[task_id] = start_trace()
+
+
+@task_postrun.connect
+def finish_task_trace(task_id, task, **kwargs):
+    started = _tasks.pop(task_id, None)
+    if started is not None:
+        finish_trace(*started, "task", task.name)
+
+
+class StateCollector:
+    """Текущее состояние доставки и пулов соединений на момент опроса
+
+    Метрики пула относятся к процессу, который отвечает на /metrics, и только
+    к уже открытым им соединениям.
+    """
+
+    def describe(self):
+        # Без описания реестр вызвал бы collect() уже при регистрации
+        return []
+
+    def collect(self):
+        from habit_reminder.db import get_pool_metrics
+        from habits.ratelimit import get_delivery_metrics
+
+        delivery = get_delivery_metrics()
+        yield GaugeMetricFamily(
+            "habit_reminder_queue_depth",
+            "Сообщения, ожидающие повторной отправки",
+            value=delivery["queue_depth"],
+        )
+        yield GaugeMetricFamily(
+            "habit_reminder_last_delivery_lag_seconds",
+            "Задержка последней отправки",
+            value=delivery["delivery_lag"],
+        )
+
+        pool = GaugeMetricFamily(
+            "habit_reminder_db_pool",
+            "Метрики пула соединений",
+            labels=("alias", "metric"),
+        )
+        for connection in connections.all(initialized_only=True):
+            for metric, value in get_pool_metrics(connection.alias).items():
+                pool.add_metric((connection.alias, metric), value)
+        yield pool
+
+
+def get_registry():
+    """Реестр для /metrics: при нескольких процессах метрики собираются из файлов
+
+    METRICS_DIRS - каталоги PROMETHEUS_MULTIPROC_DIR процессов веб-сервера и
+    воркеров Celery. Каталог, который ещё не создан, пропускается.
+    """
+    if not settings.METRICS_DIRS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    for path in settings.METRICS_DIRS:
+        if os.path.isdir(path):
+            multiprocess.MultiProcessCollector(registry, path=path)
+    registry.register(StateCollector())
+    return registry
+
+
+REGISTRY.register(StateCollector())
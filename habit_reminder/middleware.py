@@ -0,0 +1,79 @@
+from asyncio import iscoroutinefunction
+
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+from habit_reminder.metrics import finish_trace, start_trace
+from habit_reminder.routers import amark_written, get_user_key, mark_written
+
+
+def get_written_key(request, response):
+    user = getattr(request, "user", None)
+    if (
+        request.method not in SAFE_METHODS
+        and response.status_code < 400
+        and user is not None
+        and user.is_authenticated
+    ):
+        return get_user_key(user.id)
+    return None
+
+
+@sync_and_async_middleware
+def replica_stickiness_middleware(get_response):
+    """Отмечает изменения данных пользователем, чтобы он сразу видел свои записи
+
+    После успешного запроса, меняющего данные, чтения этого пользователя
+    идут в основную базу до конца окна DATABASE_REPLICA_STICKY_SECONDS.
+    Пользователя JWT-аутентификации DRF выставляет в запросе Django при
+    обработке представления, поэтому он проверяется после ответа.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            response = await get_response(request)
+            key = get_written_key(request, response)
+            if key is not None:
+                await amark_written(key)
+            return response
+
+    else:
+
+        def middleware(request):
+            response = get_response(request)
+            key = get_written_key(request, response)
+            if key is not None:
+                mark_written(key)
+            return response
+
+    return middleware
+
+
+def get_metrics_name(request):
+    match = request.resolver_match
+    return f"{request.method} {match.view_name if match else 'unmatched'}"
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Замеряет время запроса, запросы к базе, сериализацию и исходящий HTTP
+
+    Имя представления, а не путь, в метке ограничивает число временных рядов.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            trace = start_trace()
+            response = await get_response(request)
+            finish_trace(*trace, "request", get_metrics_name(request))
+            return response
+
+    else:
+
+        def middleware(request):
+            trace = start_trace()
+            response = get_response(request)
+            finish_trace(*trace, "request", get_metrics_name(request))
+            return response
+
+    return middleware
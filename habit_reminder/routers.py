@@ -0,0 +1,91 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def get_sticky_key(key):
+    return f"db:written:{key}"
+
+
+def get_user_key(user_id):
+    return f"user:{user_id}"
+
+
+def mark_written(*keys):
+    """Отмечает запись в базу: чтения по этим ключам какое-то время идут в основную"""
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {get_sticky_key(key): 1 for key in keys},
+            timeout=settings.DATABASE_REPLICA_STICKY_SECONDS,
+        )
+
+
+async def amark_written(*keys):
+    if settings.DATABASE_REPLICAS:
+        await cache.aset_many(
+            {get_sticky_key(key): 1 for key in keys},
+            timeout=settings.DATABASE_REPLICA_STICKY_SECONDS,
+        )
+
+
+def choose_replica(written):
+    if written or not settings.DATABASE_REPLICAS:
+        return DEFAULT_DB_ALIAS
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def get_replica(*keys):
+    """База для чтения: реплика, если по ключам не было недавних записей
+
+    Пока не истекло окно DATABASE_REPLICA_STICKY_SECONDS после mark_written(),
+    возвращается основная база, чтобы изменения были видны сразу, даже если
+    реплика от неё отстаёт.
+    """
+    written = settings.DATABASE_REPLICAS and cache.get_many(
+        [get_sticky_key(key) for key in keys]
+    )
+    return choose_replica(written)
+
+
+async def aget_replica(*keys):
+    written = settings.DATABASE_REPLICAS and await cache.aget_many(
+        [get_sticky_key(key) for key in keys]
+    )
+    return choose_replica(written)
+
+
+@contextmanager
+def reading_from(alias):
+    """Направляет чтения внутри блока в базу alias
+
+    Ленивые запросы, которые выполняются после выхода из блока (например,
+    потоковая выдача), нужно привязывать к базе через using().
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Чтения внутри reading_from() идут в выбранную реплику, остальное - в основную"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
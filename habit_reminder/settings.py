@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "habit_reminder.middleware.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -40,6 +41,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "habit_reminder.middleware.replica_stickiness_middleware",
 ]
 
 CORS_ALLOWED_ORIGINS = ["http://localhost:8000"]
@@ -66,6 +68,21 @@ TEMPLATES = [
 WSGI_APPLICATION = "habit_reminder.wsgi.application"
 
 
+# Пул соединений psycopg 3 в каждом процессе. Размер задаётся отдельно для
+# веб-процессов и воркеров Celery, APP_TIER выбирает, какой из них взять
+APP_TIER = os.getenv("APP_TIER", "web")
+DB_POOL_SIZES = {
+    "web": (
+        int(os.getenv("DB_POOL_WEB_MIN_SIZE", 2)),
+        int(os.getenv("DB_POOL_WEB_MAX_SIZE", 10)),
+    ),
+    "celery": (
+        int(os.getenv("DB_POOL_CELERY_MIN_SIZE", 1)),
+        int(os.getenv("DB_POOL_CELERY_MAX_SIZE", 2)),
+    ),
+}
+DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE = DB_POOL_SIZES[APP_TIER]
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -74,9 +91,41 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT"),
+        # Соединение проверяется при выдаче из пула, разорванные заменяются
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "pool": {
+                "name": f"{APP_TIER}-pool",
+                "min_size": DB_POOL_MIN_SIZE,
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+                "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", 600)),
+                "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", 3600)),
+            },
+        },
     }
 }
 
+# Реплики для чтения: хосты через запятую (host или host:port). Ленты,
+# списки и выборка напоминаний читают из них, пока по данным не было
+# записей за последние DATABASE_REPLICA_STICKY_SECONDS секунд
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv("DB_REPLICAS", "").split(","))):
+    alias = f"replica_{number + 1}"
+    host, _, port = replica.strip().partition(":")
+    pool_options = {**DATABASES["default"]["OPTIONS"]["pool"], "name": f"{alias}-pool"}
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "OPTIONS": {"pool": pool_options},
+        # В тестах реплика смотрит в тестовую копию основной базы
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["habit_reminder.routers.ReplicaRouter"]
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv("DATABASE_REPLICA_STICKY_SECONDS", 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -91,12 +140,31 @@ AUTH_PASSWORD_VALIDATORS = [
         "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
     },
 ]
+
+# Первый хешер используется для новых паролей, остальные нужны для проверки
+# старых хешей: при входе они перехешируются первым
+PASSWORD_HASHERS = os.getenv(
+    "PASSWORD_HASHERS",
+    "users.hashers.Argon2PasswordHasher,"
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+).split(",")
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 102400))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 8))
+PASSWORD_HASHING_WORKERS = int(
+    os.getenv("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1)
+)
+
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,
+    "DEFAULT_RENDERER_CLASSES": (
+        "habits.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -112,11 +180,19 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 300))
+AUTH_USER_LOCAL_CACHE_TTL = float(os.getenv("AUTH_USER_LOCAL_CACHE_TTL", 5))
+AUTH_USER_LOCAL_CACHE_SIZE = int(os.getenv("AUTH_USER_LOCAL_CACHE_SIZE", 10000))
+
+REMINDER_SHARD_COUNT = int(os.getenv("REMINDER_SHARD_COUNT", 1))
+
 CELERY_BEAT_SCHEDULE = {
-    "task-name": {
+    f"check-habits-{shard}": {
         "task": "habits.tasks.check_habits",
         "schedule": timedelta(minutes=1),
-    },
+        "args": (shard, REMINDER_SHARD_COUNT),
+    }
+    for shard in range(REMINDER_SHARD_COUNT)
 }
 
 LANGUAGE_CODE = "en-us"
@@ -133,6 +209,21 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
 
+HABITS_BULK_MAX_SIZE = int(os.getenv("HABITS_BULK_MAX_SIZE", 100))
+HABITS_EXPORT_CHUNK_SIZE = int(os.getenv("HABITS_EXPORT_CHUNK_SIZE", 2000))
+HABITS_IMPORT_BATCH_SIZE = int(os.getenv("HABITS_IMPORT_BATCH_SIZE", 5000))
+
+PUBLIC_HABITS_CACHE_TTL = int(os.getenv("PUBLIC_HABITS_CACHE_TTL", 300))
+
+REDIS_URL = os.getenv("REDIS_URL", os.getenv("CELERY_BROKER_URL"))
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 CELERY_TASK_TRACK_STARTED = True
@@ -140,3 +231,23 @@ CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", 10))
+TELEGRAM_MAX_CONCURRENCY = int(os.getenv("TELEGRAM_MAX_CONCURRENCY", 20))
+TELEGRAM_GLOBAL_RATE = int(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_INTERVAL = int(os.getenv("TELEGRAM_CHAT_INTERVAL", 1))
+TELEGRAM_COALESCE_REMINDERS = os.getenv("TELEGRAM_COALESCE_REMINDERS", "True") == "True"
+
+REMINDER_QUERY_CHUNK_SIZE = int(os.getenv("REMINDER_QUERY_CHUNK_SIZE", 2000))
+REMINDER_DELIVERY_CHUNK_SIZE = int(os.getenv("REMINDER_DELIVERY_CHUNK_SIZE", 500))
+REMINDER_MAX_CATCHUP_MINUTES = int(os.getenv("REMINDER_MAX_CATCHUP_MINUTES", 60))
+REMINDER_REQUEUE_MINUTES = int(os.getenv("REMINDER_REQUEUE_MINUTES", 15))
+
+# Токен для /metrics, без него эндпоинт доступен только при DEBUG
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Каталоги метрик процессов (PROMETHEUS_MULTIPROC_DIR), которые собирает /metrics
+METRICS_DIRS = list(
+    filter(
+        None, os.getenv("METRICS_DIRS", os.getenv("PROMETHEUS_MULTIPROC_DIR", "")).split(",")
+    )
+)
@@ -3,6 +3,8 @@ from django.urls import include, path
 from drf_spectacular.views import (SpectacularAPIView, SpectacularRedocView,
                                    SpectacularSwaggerView)
 
+from habit_reminder.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("habits/", include("habits.urls", namespace="habits")),
@@ -12,4 +14,5 @@ urlpatterns = [
         "swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"
     ),
     path("redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
+    path("metrics", metrics, name="metrics"),
 ]
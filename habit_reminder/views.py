@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from habit_reminder.metrics import get_registry
+
+
+@require_GET
+def metrics(request):
+    """Метрики в формате Prometheus
+
+    Нужен заголовок Authorization: Bearer <METRICS_TOKEN>. Без токена в
+    настройках метрики отдаются только при DEBUG.
+    """
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.headers.get("Authorization", ""),
+            f"Bearer {settings.METRICS_TOKEN}",
+        )
+    else:
+        allowed = settings.DEBUG
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
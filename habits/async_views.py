@@ -0,0 +1,130 @@
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from habit_reminder.routers import aget_replica, get_user_key, reading_from
+from habits.feed_cache import (PUBLIC_STICKY_KEY, aget_cached_page,
+                               aget_public_version, aset_cached_page,
+                               get_page_key)
+from habits.filters import HabitFilterBackend
+from habits.models import Habit
+from habits.paginators import HabitCursorPagination
+from habits.renderers import ORJSONRenderer
+from habits.views import get_list_serializer, is_not_modified
+from users.authentication import CachedJWTAuthentication
+
+
+class AsyncAPIView(View):
+    """Асинхронное представление только для чтения
+
+    Повторяет то, что делает APIView для GET-запросов: аутентификацию по JWT,
+    обработку исключений и рендеринг JSON, но пользователь и данные
+    загружаются асинхронным ORM и кэшем, без блокировки цикла событий.
+    Доступ есть только у аутентифицированных пользователей.
+    """
+
+    http_method_names = ["get", "options"]
+    authentication = CachedJWTAuthentication()
+    renderer = ORJSONRenderer()
+    filter_backend = HabitFilterBackend()
+    pagination_class = HabitCursorPagination
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        try:
+            await self.authenticate(request)
+            response = await super().dispatch(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(request, exc)
+        return response
+
+    async def authenticate(self, request):
+        user_auth_tuple = await self.authentication.aauthenticate(request)
+        if user_auth_tuple is None:
+            raise exceptions.NotAuthenticated()
+        request.user, request.auth = user_auth_tuple
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound()
+        if not isinstance(exc, exceptions.APIException):
+            raise exc
+
+        headers = {}
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            exc.status_code = status.HTTP_401_UNAUTHORIZED
+            headers["WWW-Authenticate"] = self.authentication.authenticate_header(
+                request
+            )
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        return self.render(data, exc.status_code, headers)
+
+    def render(self, data, status_code=status.HTTP_200_OK, headers=None):
+        return HttpResponse(
+            self.renderer.render(data),
+            status=status_code,
+            headers=headers,
+            content_type=self.renderer.media_type,
+        )
+
+    async def list(self, request, queryset, *sticky_keys):
+        serializer = get_list_serializer(request)
+        columns = serializer.columns
+        if "id" not in columns:
+            columns += ("id",)
+        queryset = self.filter_backend.filter_queryset(request, queryset, self)
+        paginator = self.pagination_class()
+        with reading_from(await aget_replica(*sticky_keys)):
+            page = await paginator.apaginate_queryset(
+                queryset.values(*columns), request, self
+            )
+        return paginator.get_paginated_response(serializer.serialize(page)).data
+
+
+class AsyncHabitListView(AsyncAPIView):
+    """Асинхронный список привычек пользователя"""
+
+    async def get(self, request):
+        queryset = Habit.objects.filter(user=request.user)
+        return self.render(
+            await self.list(request, queryset, get_user_key(request.user.id))
+        )
+
+
+class AsyncHabitDetailView(AsyncAPIView):
+    """Асинхронный просмотр привычки пользователя"""
+
+    async def get(self, request, pk):
+        serializer = get_list_serializer(request)
+        queryset = Habit.objects.filter(user=request.user).values(*serializer.columns)
+        try:
+            row = await queryset.aget(pk=pk)
+        except Habit.DoesNotExist:
+            raise Http404
+        return self.render(serializer.serialize([row])[0])
+
+
+class AsyncPublicListView(AsyncAPIView):
+    """Асинхронная лента публичных привычек с тем же кэшем и ETag"""
+
+    async def get(self, request):
+        key = get_page_key(await aget_public_version(), request.build_absolute_uri())
+        etag = f'"{key}"'
+        if is_not_modified(request, etag):
+            return HttpResponse(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+        data = await aget_cached_page(key)
+        if data is None:
+            data = await self.list(
+                request, Habit.public_habits.all(), PUBLIC_STICKY_KEY
+            )
+            await aset_cached_page(key, data)
+        return self.render(data, headers={"ETag": etag})
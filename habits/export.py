@@ -0,0 +1,54 @@
+import csv
+import json
+from io import StringIO
+
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def buffered(lines, size=EXPORT_BUFFER_SIZE):
+    """Склеивает строки в куски примерно по size символов"""
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buffer)
+            buffer.clear()
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def iter_ndjson(items):
+    """Привычки в формате NDJSON: по одному JSON-объекту на строку"""
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def iter_csv(items, fields):
+    """Привычки в формате CSV с заголовком из названий полей"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+    for item in items:
+        weekdays = item.get("weekdays")
+        if weekdays is not None:
+            item["weekdays"] = ",".join(map(str, weekdays))
+        writer.writerow(item.values())
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+
+
+def stream_habits(items, fields, export_format):
+    """Поток кусков выгрузки привычек в формате export_format"""
+    if export_format == "csv":
+        lines = iter_csv(items, fields)
+    else:
+        lines = iter_ndjson(items)
+    return buffered(lines)
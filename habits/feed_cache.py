@@ -0,0 +1,56 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from habit_reminder.routers import mark_written
+
+PUBLIC_VERSION_KEY = "habits:public:version"
+PUBLIC_STICKY_KEY = "habits:public"
+
+
+def get_public_version():
+    """Текущая версия ленты публичных привычек"""
+    return cache.get_or_set(PUBLIC_VERSION_KEY, lambda: uuid4().hex, timeout=None)
+
+
+def bump_public_version():
+    """Делает устаревшими все закэшированные страницы ленты публичных привычек
+
+    Новая версия ленты читается из основной базы, пока реплики не догонят
+    изменение, иначе под ней закэшировалась бы устаревшая страница.
+    """
+    mark_written(PUBLIC_STICKY_KEY)
+    cache.set(PUBLIC_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def get_page_key(version, url):
+    """Ключ кэша страницы ленты и её ETag"""
+    return f"{version}-{md5(url.encode()).hexdigest()}"
+
+
+def get_cached_page(key):
+    return cache.get(f"habits:public:page:{key}")
+
+
+def set_cached_page(key, data):
+    cache.set(
+        f"habits:public:page:{key}", data, timeout=settings.PUBLIC_HABITS_CACHE_TTL
+    )
+
+
+async def aget_public_version():
+    return await cache.aget_or_set(
+        PUBLIC_VERSION_KEY, lambda: uuid4().hex, timeout=None
+    )
+
+
+async def aget_cached_page(key):
+    return await cache.aget(f"habits:public:page:{key}")
+
+
+async def aset_cached_page(key, data):
+    await cache.aset(
+        f"habits:public:page:{key}", data, timeout=settings.PUBLIC_HABITS_CACHE_TTL
+    )
@@ -0,0 +1,91 @@
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q
+from django.utils.dateparse import parse_time
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from habits.models import SEARCH_CONFIG, SEARCH_VECTOR, Habit
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+
+class HabitFilterBackend(BaseFilterBackend):
+    """Фильтрация и полнотекстовый поиск привычек по параметрам запроса
+
+    periodicity_type - тип периодичности, is_pleasant - приятная или полезная,
+    weekday - день недели (1-7), в который выполняется привычка, time_from и
+    time_to - границы времени выполнения, search - поиск по действию и месту.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        errors = {}
+        filters = Q()
+
+        periodicity_type = params.get("periodicity_type")
+        if periodicity_type is not None:
+            if periodicity_type in Habit.Periodicity.values:
+                filters &= Q(periodicity_type=periodicity_type)
+            else:
+                errors["periodicity_type"] = "Неизвестный тип периодичности"
+
+        is_pleasant = params.get("is_pleasant")
+        if is_pleasant is not None:
+            if is_pleasant.lower() in BOOLEAN_VALUES:
+                filters &= Q(is_pleasant=BOOLEAN_VALUES[is_pleasant.lower()])
+            else:
+                errors["is_pleasant"] = "Ожидается true или false"
+
+        weekday = params.get("weekday")
+        if weekday is not None:
+            if weekday in {str(day) for day in Habit.WeekDays.values}:
+                filters &= Q(periodicity_type=Habit.Periodicity.DAILY) | Q(
+                    weekdays__contains=[int(weekday)]
+                )
+            else:
+                errors["weekday"] = "День недели должен быть числом от 1 до 7"
+
+        for param, lookup in (("time_from", "time__gte"), ("time_to", "time__lte")):
+            value = params.get(param)
+            if value is not None:
+                try:
+                    moment = parse_time(value)
+                except ValueError:
+                    moment = None
+                if moment is None:
+                    errors[param] = "Ожидается время в формате ЧЧ:ММ[:СС]"
+                else:
+                    filters &= Q(**{lookup: moment})
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        queryset = queryset.filter(filters)
+
+        search = params.get("search", "").strip()
+        if search:
+            queryset = queryset.alias(search=SEARCH_VECTOR).filter(
+                search=SearchQuery(
+                    search, config=SEARCH_CONFIG, search_type="websearch"
+                )
+            )
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        parameters = (
+            ("periodicity_type", "string", "Тип периодичности: DAILY или WEEKLY"),
+            ("is_pleasant", "boolean", "Только приятные или только полезные"),
+            ("weekday", "integer", "День недели (1-7), в который выполняется привычка"),
+            ("time_from", "string", "Время выполнения не раньше, ЧЧ:ММ[:СС]"),
+            ("time_to", "string", "Время выполнения не позже, ЧЧ:ММ[:СС]"),
+            ("search", "string", "Полнотекстовый поиск по действию и месту"),
+        )
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "description": description,
+                "schema": {"type": schema_type},
+            }
+            for name, schema_type, description in parameters
+        ]
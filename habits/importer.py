@@ -0,0 +1,230 @@
+import csv
+import json
+from io import StringIO
+from itertools import islice
+from time import perf_counter
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from rest_framework import serializers
+
+from habits.feed_cache import bump_public_version
+from habits.models import Habit
+from habits.schedule import sync_habits_schedule
+from habits.serializers import HabitSerializer
+
+IMPORT_FORMATS = ("ndjson", "csv")
+IMPORT_COLUMNS = (
+    "user_id",
+    "place",
+    "time",
+    "action",
+    "is_pleasant",
+    "duration",
+    "is_public",
+    "periodicity_type",
+    "weekdays",
+    "reward",
+    "related_habit_id",
+)
+# Привычки с теми же значениями этих столбцов у пользователя уже есть
+IMPORT_KEY = ("user_id", "action", "place", "time", "periodicity_type")
+
+
+class ImportResult(NamedTuple):
+    """Итог импорта привычек"""
+
+    created: int
+    skipped: int
+    rejected: list
+    elapsed: float
+    # Ошибка чтения файла, прервавшая импорт после уже загруженных пачек
+    error: str | None = None
+
+    @property
+    def rows(self):
+        return self.created + self.skipped + len(self.rejected)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def parse_ndjson(lines):
+    """Строки NDJSON -> пары (номер строки, словарь или ошибка разбора)"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, serializers.ValidationError(f"Некорректный JSON: {exc}")
+            continue
+        yield number, row
+
+
+def parse_csv(lines):
+    """Строки CSV с заголовком -> пары (номер строки, словарь)
+
+    Пустые значения пропускаются, чтобы сработали значения по умолчанию,
+    дни недели перечисляются через запятую.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        row = {field: value for field, value in row.items() if field and value}
+        if "weekdays" in row:
+            row["weekdays"] = row["weekdays"].split(",")
+        yield reader.line_num, row
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        return "{" + ",".join(map(str, value)) + "}"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(cursor, table, rows):
+    """Загружает строки в таблицу командой COPY"""
+    buffer = StringIO()
+    for row in rows:
+        buffer.write("\t".join(map(copy_value, row)))
+        buffer.write("\n")
+    columns = ", ".join(f'"{column}"' for column in IMPORT_COLUMNS)
+    sql = f"COPY {table} ({columns}) FROM STDIN"
+    if is_psycopg3:
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+    else:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+def validate_rows(user, batch):
+    """Проверяет пачку строк правилами HabitSerializer
+
+    Связанные привычки всей пачки загружаются одним запросом.
+    Возвращает проверенные данные и отклонённые строки.
+    """
+    serializer = HabitSerializer(
+        data=[row for _, row in batch],
+        many=True,
+        max_length=None,
+        context={"user": user},
+    )
+    validated = []
+    rejected = []
+    for number, row in batch:
+        if isinstance(row, serializers.ValidationError):
+            rejected.append((number, row.detail))
+            continue
+        try:
+            validated.append(serializer.child.run_validation(row))
+        except serializers.ValidationError as exc:
+            rejected.append((number, exc.detail))
+    return validated, rejected
+
+
+def get_copy_row(user, attrs):
+    """Строка временной таблицы импорта из проверенных данных привычки"""
+    related_habit = attrs.get("related_habit")
+    return (
+        user.id,
+        *(
+            attrs.get(field, Habit._meta.get_field(field).get_default())
+            for field in IMPORT_COLUMNS[1:-1]
+        ),
+        related_habit.id if related_habit else None,
+    )
+
+
+def write_rows(user, validated):
+    """Пишет пачку через COPY во временную таблицу и переносит новые привычки
+
+    Привычки, которые у пользователя уже есть, не дублируются.
+    Возвращает id созданных привычек.
+    """
+    table = Habit._meta.db_table
+    key = ", ".join(f'"{column}"' for column in IMPORT_KEY)
+    match = " AND ".join(
+        f'habit."{column}" = staging."{column}"' for column in IMPORT_KEY
+    )
+    columns = ", ".join(f'"{column}"' for column in IMPORT_COLUMNS)
+    rows = (get_copy_row(user, attrs) for attrs in validated)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE habit_import ON COMMIT DROP "
+            f"AS SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        copy_rows(cursor, "habit_import", rows)
+        cursor.execute(f"""
+            INSERT INTO {table} ({columns})
+            SELECT DISTINCT ON ({key}) {columns}
+            FROM habit_import AS staging
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table} AS habit WHERE {match}
+            )
+            RETURNING id
+            """)
+        habit_ids = [habit_id for habit_id, in cursor.fetchall()]
+        cursor.execute("DROP TABLE habit_import")
+    return habit_ids
+
+
+def import_habits(user, rows, batch_size=None):
+    """Импортирует привычки пользователя из потока пар (номер строки, словарь)
+
+    Каждая пачка проверяется, загружается и ставится в расписание в своей
+    транзакции. Привычки, совпадающие с уже существующими по IMPORT_KEY,
+    пропускаются (INSERT ... WHERE NOT EXISTS) и не обновляются. Если файл
+    не читается в UTF-8, импорт останавливается, а загруженные до этого
+    пачки остаются в базе. Сигналы модели не срабатывают, поэтому расписание
+    и кэш ленты обновляются здесь.
+    """
+    batch_size = batch_size or settings.HABITS_IMPORT_BATCH_SIZE
+    started = perf_counter()
+    created = skipped = 0
+    rejected = []
+    error = None
+    has_public = False
+    rows = iter(rows)
+    try:
+        while batch := list(islice(rows, batch_size)):
+            validated, batch_rejected = validate_rows(user, batch)
+            rejected.extend(batch_rejected)
+            if not validated:
+                continue
+            with transaction.atomic():
+                habit_ids = write_rows(user, validated)
+                habits = list(
+                    Habit.objects.filter(id__in=habit_ids).select_related("user")
+                )
+                sync_habits_schedule(habits)
+            created += len(habit_ids)
+            skipped += len(validated) - len(habit_ids)
+            has_public = has_public or any(habit.is_public for habit in habits)
+    except UnicodeDecodeError:
+        error = "Файл должен быть в UTF-8"
+    finally:
+        if has_public:
+            bump_public_version()
+    return ImportResult(created, skipped, rejected, perf_counter() - started, error)
+
+
+def parse_habits(lines, import_format):
+    """Разбирает строки файла импорта в формате import_format"""
+    if import_format == "csv":
+        return parse_csv(lines)
+    return parse_ndjson(lines)
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.importer import IMPORT_FORMATS, import_habits, parse_habits
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует привычки пользователя из файла NDJSON или CSV; привычки, "
+        "которые у пользователя уже есть, пропускаются и не обновляются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу с привычками")
+        parser.add_argument(
+            "--user", required=True, help="Имя пользователя - владельца привычек"
+        )
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Формат файла, по умолчанию определяется по расширению",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Число строк в одной пачке загрузки"
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        import_format = options["format"] or path.suffix.lstrip(".").lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(
+                f"Не удалось определить формат файла {path}, укажите --format"
+            )
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        with path.open(encoding="utf-8-sig", newline="") as lines:
+            result = import_habits(
+                user, parse_habits(lines, import_format), options["batch_size"]
+            )
+
+        for number, errors in result.rejected:
+            self.stderr.write(f"Строка {number}: {errors}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано привычек: {result.created}, уже были: {result.skipped}, "
+                f"отклонено: {len(result.rejected)}, "
+                f"{result.rows_per_second:.0f} строк/с"
+            )
+        )
+        if result.error:
+            raise CommandError(f"{result.error}, импорт остановлен")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.schedule import (get_actual_schedule, get_expected_schedule,
+                             rebuild_schedule)
+
+
+class Command(BaseCommand):
+    help = "Перестраивает расписание напоминаний и сверяет его с таблицей привычек"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только сверить расписание, не перестраивая его",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            count = rebuild_schedule()
+            self.stdout.write(f"Расписание перестроено, слотов: {count}")
+
+        expected = get_expected_schedule()
+        actual = get_actual_schedule()
+        missing = expected - actual
+        extra = actual - expected
+        if missing or extra:
+            raise CommandError(
+                f"Расписание не совпадает с привычками: "
+                f"не хватает {len(missing)}, лишних {len(extra)}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Расписание совпадает с привычками: {len(actual)}")
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:30
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0003_alter_habit_weekdays"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("is_pleasant", False)),
+                fields=["time", "periodicity_type"],
+                name="habit_due_time_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["weekdays"], name="habit_weekdays_gin_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_reminder_slots(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    ReminderSlot = apps.get_model("habits", "ReminderSlot")
+    slots = []
+    for habit in Habit.objects.filter(is_pleasant=False).iterator():
+        weekdays = habit.weekdays if habit.periodicity_type == "WEEKLY" else range(1, 8)
+        minute = habit.time.hour * 60 + habit.time.minute
+        slots.extend(
+            ReminderSlot(slot=(weekday - 1) * 24 * 60 + minute, habit=habit)
+            for weekday in set(weekdays or ())
+        )
+    ReminderSlot.objects.bulk_create(slots, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0004_habit_due_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("slot", models.PositiveIntegerField(verbose_name="Минута недели")),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reminder_slots",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Слот расписания",
+                "verbose_name_plural": "Расписание напоминаний",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("slot", "habit"), name="reminder_slot_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_reminder_slots, migrations.RunPython.noop),
+    ]
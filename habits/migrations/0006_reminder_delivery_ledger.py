@@ -0,0 +1,97 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0005_reminderslot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SchedulerWatermark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=50,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Название",
+                    ),
+                ),
+                ("processed_until", models.DateTimeField(verbose_name="Обработано до")),
+            ],
+            options={
+                "verbose_name": "Отметка планировщика",
+                "verbose_name_plural": "Отметки планировщика",
+            },
+        ),
+        migrations.CreateModel(
+            name="ReminderDelivery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scheduled_at",
+                    models.DateTimeField(verbose_name="Время напоминания"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Ожидает отправки"),
+                            ("QUEUED", "Передано на отправку"),
+                            ("SENT", "Отправлено"),
+                            ("FAILED", "Ошибка отправки"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Отправлено"
+                    ),
+                ),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Доставка напоминания",
+                "verbose_name_plural": "Журнал доставки напоминаний",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "PENDING")),
+                        fields=["scheduled_at"],
+                        name="reminder_delivery_pending_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("habit", "scheduled_at"),
+                        name="reminder_delivery_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0006_reminder_delivery_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reminderslot",
+            name="timezone",
+            field=models.CharField(
+                default="UTC", max_length=64, verbose_name="Часовой пояс владельца"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reminderslot",
+            index=models.Index(
+                fields=["timezone", "slot"], name="reminder_slot_tz_idx"
+            ),
+        ),
+    ]
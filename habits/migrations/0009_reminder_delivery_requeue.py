@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0008_habit_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="reminderdelivery",
+            name="reminder_delivery_pending_idx",
+        ),
+        migrations.AddField(
+            model_name="reminderdelivery",
+            name="queued_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Передано на отправку"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reminderdelivery",
+            index=models.Index(
+                condition=models.Q(("status__in", ["PENDING", "QUEUED"])),
+                fields=["scheduled_at"],
+                name="reminder_delivery_unsent_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_reminder_delivery_requeue"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="habit",
+            name="habit_due_time_idx",
+        ),
+    ]
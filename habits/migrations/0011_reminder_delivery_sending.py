@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0010_drop_habit_due_time_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reminderdelivery",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Ожидает отправки"),
+                    ("QUEUED", "Передано на отправку"),
+                    ("SENDING", "Отправляется"),
+                    ("SENT", "Отправлено"),
+                    ("FAILED", "Ошибка отправки"),
+                ],
+                default="PENDING",
+                max_length=10,
+                verbose_name="Статус",
+            ),
+        ),
+    ]
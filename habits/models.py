@@ -1,5 +1,16 @@
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
+from django.db.models import Q
+
+SEARCH_CONFIG = "russian"
+SEARCH_VECTOR = SearchVector("action", "place", config=SEARCH_CONFIG)
+
+
+def _snapshot(value):
+    # Списки копируются, чтобы изменение на месте не меняло и снимок
+    return value.copy() if isinstance(value, list) else value
 
 
 class PublicHabitManager(models.Manager):
@@ -66,8 +77,143 @@ class Habit(models.Model):
         verbose_name = "Привычка"
         verbose_name_plural = "Привычки"
         ordering = ("id",)
+        indexes = [
+            GinIndex(fields=["weekdays"], name="habit_weekdays_gin_idx"),
+            GinIndex(SEARCH_VECTOR, name="habit_search_gin_idx"),
+            models.Index(fields=["user", "time"], name="habit_user_time_idx"),
+            models.Index(
+                fields=["time"],
+                condition=Q(is_public=True),
+                name="habit_public_time_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
             f"{'Приятная' if self.is_pleasant else 'Полезная'} привычка: {self.action}"
         )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, map(_snapshot, values)))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        deferred_fields = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: _snapshot(getattr(self, field.attname))
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred_fields
+        }
+
+    def get_loaded_value(self, field_name, default=None):
+        """Значение поля на момент загрузки из базы или последнего сохранения"""
+        return getattr(self, "_loaded_values", {}).get(field_name, default)
+
+    def has_changed(self, *field_names):
+        """Изменилось ли хотя бы одно из полей с момента загрузки из базы
+
+        Для привычки, которая ещё не загружалась и не сохранялась, - всегда да.
+        """
+        loaded_values = getattr(self, "_loaded_values", None)
+        if loaded_values is None:
+            return True
+        return any(
+            field_name not in loaded_values
+            or loaded_values[field_name] != getattr(self, field_name)
+            for field_name in field_names
+        )
+
+
+class ReminderSlot(models.Model):
+    """Слот расписания напоминаний: минута недели по местному времени владельца"""
+
+    slot = models.PositiveIntegerField(verbose_name="Минута недели")
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name="reminder_slots",
+        verbose_name="Привычка",
+    )
+    timezone = models.CharField(
+        max_length=64, default="UTC", verbose_name="Часовой пояс владельца"
+    )
+
+    class Meta:
+        verbose_name = "Слот расписания"
+        verbose_name_plural = "Расписание напоминаний"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["slot", "habit"], name="reminder_slot_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["timezone", "slot"], name="reminder_slot_tz_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.slot}: {self.habit_id}"
+
+
+class ReminderDelivery(models.Model):
+    """Запись журнала доставки напоминания о привычке"""
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Ожидает отправки"
+        QUEUED = "QUEUED", "Передано на отправку"
+        SENDING = "SENDING", "Отправляется"
+        SENT = "SENT", "Отправлено"
+        FAILED = "FAILED", "Ошибка отправки"
+
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        verbose_name="Привычка",
+    )
+    scheduled_at = models.DateTimeField(verbose_name="Время напоминания")
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Статус",
+    )
+    queued_at = models.DateTimeField(
+        blank=True, null=True, verbose_name="Передано на отправку"
+    )
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Доставка напоминания"
+        verbose_name_plural = "Журнал доставки напоминаний"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["habit", "scheduled_at"], name="reminder_delivery_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["scheduled_at"],
+                condition=Q(status__in=["PENDING", "QUEUED"]),
+                name="reminder_delivery_unsent_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} {self.scheduled_at:%Y-%m-%d %H:%M}: {self.status}"
+
+
+class SchedulerWatermark(models.Model):
+    """Время, до которого напоминания уже занесены в журнал доставки"""
+
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="Название")
+    processed_until = models.DateTimeField(verbose_name="Обработано до")
+
+    class Meta:
+        verbose_name = "Отметка планировщика"
+        verbose_name_plural = "Отметки планировщика"
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
@@ -0,0 +1,101 @@
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class HabitCursorPagination(CursorPagination):
+    """Пагинация привычек по курсору на id
+
+    В отличие от номеров страниц не считает COUNT(*) и не пропускает строки
+    через OFFSET, поэтому любая страница стоит одинаково.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset() на aiterator()"""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset.aiterator()])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Запрос страницы с одной лишней строкой для проверки следующей
+
+        Первая половина CursorPagination.paginate_queryset() до обращения к
+        базе, вторая - set_page().
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self.offset, self.reverse, self.current_position = 0, False, None
+        else:
+            self.offset, self.reverse, self.current_position = self.cursor
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith("-")
+            order_attr = order.lstrip("-")
+            if self.cursor.reverse != is_reversed:
+                kwargs = {order_attr + "__lt": self.current_position}
+            else:
+                kwargs = {order_attr + "__gt": self.current_position}
+            queryset = queryset.filter(**kwargs)
+
+        start = self.offset
+        end = start + self.page_size + 1
+        return queryset[start:end]
+
+    def set_page(self, results):
+        """Страница и позиции соседних страниц по строкам из get_page_queryset()"""
+        offset, reverse = self.offset, self.reverse
+        current_position = self.current_position
+        self.page = list(results[: self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
@@ -5,4 +5,4 @@ class IsOwner(permissions.BasePermission):
     """Разрешение, которое позволяет доступ только владельцу привычки"""
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return obj.user_id == request.user.id
@@ -0,0 +1,75 @@
+from math import ceil
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PAUSE_KEY = "telegram:pause"
+QUEUE_DEPTH_KEY = "telegram:queue_depth"
+DELIVERY_LAG_KEY = "telegram:delivery_lag"
+
+
+def increment(key, delta=1, timeout=None):
+    """Увеличивает счётчик в кэше, создавая его, если ключа нет или он истёк"""
+    while True:
+        cache.add(key, 0, timeout=timeout)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Ключ истёк между add и incr
+            continue
+
+
+def acquire_send_slot(tg_chat_id):
+    """Занимает место под отправку сообщения в чат с учётом лимитов Telegram
+
+    Лимиты общие для всех воркеров: не больше TELEGRAM_GLOBAL_RATE сообщений
+    в секунду на бота и одно сообщение в TELEGRAM_CHAT_INTERVAL секунд на чат.
+    Возвращает 0, если сообщение можно отправлять сейчас, иначе число секунд,
+    через которое стоит попробовать снова.
+    """
+    moment = time()
+    paused_until = cache.get(PAUSE_KEY)
+    if paused_until and paused_until > moment:
+        return ceil(paused_until - moment)
+
+    chat_key = f"telegram:chat:{tg_chat_id}"
+    if not cache.add(chat_key, 1, timeout=settings.TELEGRAM_CHAT_INTERVAL):
+        return settings.TELEGRAM_CHAT_INTERVAL
+
+    second_key = f"telegram:global:{int(moment)}"
+    if increment(second_key, timeout=2) > settings.TELEGRAM_GLOBAL_RATE:
+        cache.delete(chat_key)
+        return 1
+    return 0
+
+
+def pause_sending(retry_after):
+    """Приостанавливает все отправки после ответа 429 от Telegram"""
+    cache.set(PAUSE_KEY, time() + retry_after, timeout=ceil(retry_after) + 1)
+
+
+def track_deferred(count):
+    """Учитывает сообщения, отложенные до следующей попытки"""
+    increment(QUEUE_DEPTH_KEY, count)
+
+
+def track_resumed(count):
+    """Учитывает отложенные сообщения, взятые в работу"""
+    try:
+        cache.decr(QUEUE_DEPTH_KEY, count)
+    except ValueError:
+        pass
+
+
+def track_delivery_lag(seconds):
+    """Запоминает задержку доставки относительно запланированного времени"""
+    cache.set(DELIVERY_LAG_KEY, seconds, timeout=None)
+
+
+def get_delivery_metrics():
+    """Метрики очереди доставки: число отложенных сообщений и задержка доставки"""
+    return {
+        "queue_depth": max(cache.get(QUEUE_DEPTH_KEY, 0), 0),
+        "delivery_lag": cache.get(DELIVERY_LAG_KEY, 0.0),
+    }
@@ -0,0 +1,152 @@
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_time
+
+from habits.models import Habit, ReminderSlot
+
+MINUTES_PER_DAY = 24 * 60
+ONE_MINUTE = timedelta(minutes=1)
+TIMEZONES_CACHE_KEY = "habits:schedule:timezones"
+TIMEZONES_CACHE_TIMEOUT = 10 * 60
+
+
+def get_slot(weekday, time):
+    """Номер минуты недели для дня недели (1-7) и времени"""
+    return (weekday - 1) * MINUTES_PER_DAY + time.hour * 60 + time.minute
+
+
+def get_moment_slot(moment):
+    """Номер минуты недели для момента времени"""
+    return get_slot(moment.isoweekday(), moment.time())
+
+
+def get_habit_slots(is_pleasant, periodicity_type, weekdays, time):
+    """Минуты недели, в которые нужно напомнить о привычке"""
+    if is_pleasant:
+        return set()
+    if isinstance(time, str):
+        time = parse_time(time)
+    if periodicity_type != Habit.Periodicity.WEEKLY:
+        weekdays = Habit.WeekDays.values
+    return {get_slot(weekday, time) for weekday in weekdays or ()}
+
+
+def get_active_timezones():
+    """Часовые пояса, в которых живут пользователи"""
+    timezones = cache.get(TIMEZONES_CACHE_KEY)
+    if timezones is None:
+        timezones = list(
+            get_user_model()
+            .objects.order_by()
+            .values_list("timezone", flat=True)
+            .distinct()
+        )
+        cache.set(TIMEZONES_CACHE_KEY, timezones, TIMEZONES_CACHE_TIMEOUT)
+    return timezones
+
+
+def register_timezone(name):
+    """Сбрасывает кэш часовых поясов пользователей, если в нём нет пояса name"""
+    timezones = cache.get(TIMEZONES_CACHE_KEY)
+    if timezones is not None and name not in timezones:
+        cache.delete(TIMEZONES_CACHE_KEY)
+
+
+def get_local_slots(minutes, timezones):
+    """Местные минуты недели для моментов времени в каждом часовом поясе
+
+    Возвращает словарь (часовой пояс, минута недели) -> момент времени.
+    Повторяющаяся при переходе на зимнее время минута учитывается один раз.
+    Минуты, пропущенные при переходе на летнее время, относятся к первому
+    моменту после перевода часов.
+    """
+    local_slots = {}
+    for name in timezones:
+        zone = ZoneInfo(name)
+        for minute in minutes:
+            local = minute.astimezone(zone)
+            if not local.fold:
+                local_slots[(name, get_moment_slot(local))] = minute
+            # Разница местного времени соседних минут больше минуты только при переводе вперёд
+            previous = (minute - ONE_MINUTE).astimezone(zone)
+            skipped = local.replace(tzinfo=None) - previous.replace(tzinfo=None)
+            while skipped > ONE_MINUTE:
+                skipped -= ONE_MINUTE
+                local_slots[(name, get_moment_slot(local - skipped))] = minute
+    return local_slots
+
+
+def sync_habit_schedule(habit):
+    """Пересчитывает слоты расписания одной привычки"""
+    sync_habits_schedule([habit])
+
+
+def sync_habits_schedule(habits):
+    """Пересчитывает слоты расписания привычек одним удалением и одной вставкой"""
+    with transaction.atomic():
+        ReminderSlot.objects.filter(habit__in=habits).delete()
+        ReminderSlot.objects.bulk_create(
+            ReminderSlot(slot=slot, habit=habit, timezone=habit.user.timezone)
+            for habit in habits
+            for slot in get_habit_slots(
+                habit.is_pleasant, habit.periodicity_type, habit.weekdays, habit.time
+            )
+        )
+
+
+def sync_user_schedule(user):
+    """Переносит слоты расписания привычек пользователя в его часовой пояс"""
+    ReminderSlot.objects.filter(habit__user=user).exclude(
+        timezone=user.timezone
+    ).update(timezone=user.timezone)
+    register_timezone(user.timezone)
+
+
+def get_expected_schedule():
+    """Слоты расписания, вычисленные по таблице привычек"""
+    habits = (
+        Habit.objects.filter(is_pleasant=False)
+        .order_by()
+        .values_list(
+            "id",
+            "user__timezone",
+            "is_pleasant",
+            "periodicity_type",
+            "weekdays",
+            "time",
+        )
+        .iterator()
+    )
+    return {
+        (slot, habit_id, timezone)
+        for habit_id, timezone, *fields in habits
+        for slot in get_habit_slots(*fields)
+    }
+
+
+def get_actual_schedule():
+    """Слоты расписания, сохранённые в базе"""
+    return set(
+        ReminderSlot.objects.order_by()
+        .values_list("slot", "habit_id", "timezone")
+        .iterator()
+    )
+
+
+@transaction.atomic
+def rebuild_schedule(batch_size=5000):
+    """Полностью перестраивает расписание напоминаний"""
+    expected = get_expected_schedule()
+    ReminderSlot.objects.all().delete()
+    ReminderSlot.objects.bulk_create(
+        (
+            ReminderSlot(slot=slot, habit_id=habit_id, timezone=timezone)
+            for slot, habit_id, timezone in expected
+        ),
+        batch_size=batch_size,
+    )
+    return len(expected)
@@ -1,5 +1,12 @@
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
+from habit_reminder.metrics import timed
+from habits.feed_cache import bump_public_version
 from habits.models import Habit
+from habits.schedule import sync_habits_schedule
 from .validators import (
     validate_reward_and_related_habit,
     validate_duration,
@@ -9,11 +16,140 @@ from .validators import (
 )
 
 
+def parse_id(value):
+    """Первичный ключ привычки из входных данных или None"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+class RelatedHabitField(serializers.PrimaryKeyRelatedField):
+    """Связанная привычка: только приятная привычка того же пользователя
+
+    Все связанные привычки, на которые ссылаются данные корневого
+    сериализатора, загружаются одним запросом при разборе первой из них и
+    хранятся в корневом сериализаторе. Так число запросов не зависит от числа
+    проверяемых привычек.
+    """
+
+    default_error_messages = {
+        "does_not_exist": "Приятная привычка с id {pk_value} не найдена",
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(is_pleasant=True)
+        user = self.context.get("user")
+        request = self.context.get("request")
+        if user is None and request is not None and request.user.is_authenticated:
+            user = request.user
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        return queryset
+
+    def get_related_habits(self):
+        """Связанные привычки всех элементов корневого сериализатора"""
+        root = self.root
+        if not hasattr(root, "_related_habits"):
+            data = getattr(root, "initial_data", None)
+            items = data if isinstance(data, list) else [data]
+            ids = {
+                parse_id(item.get(self.field_name))
+                for item in items
+                if isinstance(item, dict)
+            }
+            ids.discard(None)
+            root._related_habits = self.get_queryset().in_bulk(ids) if ids else {}
+        return root._related_habits
+
+    def to_internal_value(self, data):
+        pk = parse_id(data)
+        if pk is None:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        related_habit = self.get_related_habits().get(pk)
+        if related_habit is None:
+            self.fail("does_not_exist", pk_value=data)
+        return related_habit
+
+
+class HabitBulkSerializer(serializers.ListSerializer):
+    """Массовое создание и обновление привычек
+
+    Запись идёт через bulk_create/bulk_update в одной транзакции. Сигналы
+    модели при этом не срабатывают, поэтому расписание и кэш ленты
+    обновляются здесь же.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", settings.HABITS_BULK_MAX_SIZE)
+        kwargs.setdefault("allow_empty", False)
+        super().__init__(*args, **kwargs)
+
+    def get_instances(self):
+        if not hasattr(self, "_instances"):
+            self._instances = {habit.id: habit for habit in self.instance}
+        return self._instances
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            habit_id = parse_id(data.get("id")) if isinstance(data, dict) else None
+            if habit_id not in self.get_instances():
+                raise serializers.ValidationError({"id": "Привычка не найдена"})
+            self.child.instance = self.get_instances()[habit_id]
+        try:
+            return super().run_child_validation(data)
+        finally:
+            self.child.instance = None
+
+    def create(self, validated_data):
+        habits = [Habit(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            Habit.objects.bulk_create(habits)
+            sync_habits_schedule(habits)
+        if any(habit.is_public for habit in habits):
+            bump_public_version()
+        return habits
+
+    def update(self, instance, validated_data):
+        instances = self.get_instances()
+        habits = []
+        fields = set()
+        for item, attrs in zip(self.initial_data, validated_data):
+            habit = instances[parse_id(item["id"])]
+            for field, value in attrs.items():
+                setattr(habit, field, value)
+            fields.update(attrs)
+            habits.append(habit)
+        with transaction.atomic():
+            if fields:
+                Habit.objects.bulk_update(habits, fields)
+            sync_habits_schedule(habits)
+        if any(
+            habit.is_public or habit.get_loaded_value("is_public") for habit in habits
+        ):
+            bump_public_version()
+        return habits
+
+
 class HabitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Habit
         fields = "__all__"
         read_only_fields = ("user",)
+        list_serializer_class = HabitBulkSerializer
+
+    def build_relational_field(self, field_name, relation_info):
+        field_class, field_kwargs = super().build_relational_field(
+            field_name, relation_info
+        )
+        if field_name == "related_habit":
+            field_class = RelatedHabitField
+        return field_class, field_kwargs
+
+    def to_representation(self, instance):
+        with timed("serializer"):
+            return super().to_representation(instance)
 
     def validate(self, data):
         validate_reward_and_related_habit(data)
@@ -23,3 +159,59 @@ class HabitSerializer(serializers.ModelSerializer):
         validate_periodicity_and_weekdays(data, Habit.Periodicity)
 
         return data
+
+
+class HabitListSerializer:
+    """Сериализатор списка привычек только для чтения
+
+    Работает со строками из values(columns) без создания экземпляров модели
+    и полей DRF. Результат совпадает с HabitSerializer по ключам, их порядку
+    и значениям. Можно запросить только часть полей: тогда и из базы
+    выбираются только их столбцы.
+    """
+
+    fields = (
+        "id",
+        "place",
+        "time",
+        "action",
+        "is_pleasant",
+        "duration",
+        "is_public",
+        "periodicity_type",
+        "weekdays",
+        "reward",
+        "user",
+        "related_habit",
+    )
+    columns = fields[:-2] + ("user_id", "related_habit_id")
+
+    def __init__(self, fields=None):
+        if fields:
+            unknown = set(fields).difference(type(self).fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {"fields": f"Неизвестные поля: {', '.join(sorted(unknown))}"}
+                )
+            column_names = dict(zip(type(self).fields, type(self).columns))
+            self.fields = tuple(field for field in type(self).fields if field in fields)
+            self.columns = tuple(column_names[field] for field in self.fields)
+        if len(self.columns) == 1:
+            column = self.columns[0]
+            self._get_values = lambda row: (row[column],)
+        else:
+            self._get_values = itemgetter(*self.columns)
+
+    def serialize(self, rows):
+        with timed("serializer"):
+            return list(self.iterate(rows))
+
+    def iterate(self, rows):
+        fields = self.fields
+        get_values = self._get_values
+        has_time = "time" in fields
+        for row in rows:
+            item = dict(zip(fields, get_values(row)))
+            if has_time:
+                item["time"] = item["time"].isoformat()
+            yield item
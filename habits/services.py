@@ -1,10 +1,147 @@
-import requests
+import asyncio
+import logging
+import threading
+from typing import NamedTuple
+
+import httpx
 from django.conf import settings
 
+from habit_reminder.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+_sender = threading.local()
+
+
+class DeliveryResult(NamedTuple):
+    """Результат отправки одного сообщения в Telegram"""
+
+    tg_chat_id: str
+    ok: bool
+    status_code: int | None = None
+    error: str | None = None
+    retry_after: int | None = None
+
+
+def build_reminder_message(action, time, place):
+    """Текст напоминания о привычке"""
+    return f"Я буду {action} в {time.strftime('%H:%M')} в {place}"
+
+
+def _get_retry_after(response):
+    try:
+        return int(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return int(response.headers.get("Retry-After", 1))
+
+
+def coalesce_messages(messages, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Склеивает сообщения одного чата за одно время напоминания в одно сообщение
+
+    Тексты объединяются через перевод строки и делятся на части только там,
+    где сообщение превысило бы лимит длины Telegram. Части длинного текста,
+    кроме последней, несут те же записи журнала с пометкой partial: их
+    ошибка отмечает доставку неудачной, но отправка её не завершает.
+    """
+    grouped = {}
+    for message in messages:
+        key = (message["tg_chat_id"], message["scheduled_at"])
+        grouped.setdefault(key, []).append(message)
+
+    coalesced = []
+    for (tg_chat_id, scheduled_at), group in grouped.items():
+        parts = []
+        for message in group:
+            text = message["text"]
+            delivery_ids = message.get("delivery_ids", [])
+            if parts and len(parts[-1][0]) + 1 + len(text) <= limit:
+                parts[-1][0] = f"{parts[-1][0]}\n{text}"
+                parts[-1][1].extend(delivery_ids)
+                continue
+            while len(text) > limit:
+                parts.append([text[:limit], list(delivery_ids), True])
+                text = text[limit:]
+            parts.append([text, list(delivery_ids), False])
+        for text, delivery_ids, partial in parts:
+            message = {
+                "text": text,
+                "tg_chat_id": tg_chat_id,
+                "scheduled_at": scheduled_at,
+                "delivery_ids": delivery_ids,
+            }
+            if partial:
+                message["partial"] = True
+            coalesced.append(message)
+    return coalesced
+
+
+async def _send_message(client, semaphore, message, tg_chat_id):
+    url = f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+    async with semaphore:
+        try:
+            response = await client.post(
+                url,
+                data={"chat_id": tg_chat_id, "text": message},
+                timeout=settings.TELEGRAM_TIMEOUT,
+            )
+        except httpx.HTTPError as exc:
+            return DeliveryResult(tg_chat_id, False, error=repr(exc))
+    if response.is_success:
+        return DeliveryResult(tg_chat_id, True, response.status_code)
+    retry_after = None
+    if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+        retry_after = _get_retry_after(response)
+    return DeliveryResult(
+        tg_chat_id, False, response.status_code, response.text, retry_after
+    )
+
+
+def _get_sender():
+    """Цикл событий и HTTP-клиент потока
+
+    Живут столько же, сколько поток воркера, поэтому соединения с Telegram
+    переиспользуются между пакетами.
+    """
+    if not hasattr(_sender, "client"):
+        concurrency = settings.TELEGRAM_MAX_CONCURRENCY
+        limits = httpx.Limits(
+            max_connections=concurrency, max_keepalive_connections=concurrency
+        )
+        _sender.loop = asyncio.new_event_loop()
+        _sender.client = httpx.AsyncClient(limits=limits)
+    return _sender.loop, _sender.client
+
+
+async def _send_messages(client, messages):
+    semaphore = asyncio.Semaphore(settings.TELEGRAM_MAX_CONCURRENCY)
+    return await asyncio.gather(
+        *(
+            _send_message(client, semaphore, message, tg_chat_id)
+            for message, tg_chat_id in messages
+        )
+    )
+
+
+def send_telegram_messages(messages):
+    """Отправка пакета сообщений (текст, chat_id) в Telegram через бот
 
-def send_telegram_message(message, tg_chat_id):
-    """Отправка сообщения в Telegram через бот"""
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    data = {"chat_id": tg_chat_id, "text": message}
-    requests.post(url, data=data)
-    print("Сообщение отправлено")
+    Сообщения уходят параллельно через общий пул соединений, число одновременных
+    запросов ограничено TELEGRAM_MAX_CONCURRENCY. Возвращает результаты в том же
+    порядке, что и сообщения.
+    """
+    if not messages:
+        return []
+    loop, client = _get_sender()
+    with timed("http"):
+        results = loop.run_until_complete(_send_messages(client, messages))
+    for result in results:
+        if not result.ok:
+            logger.warning(
+                "Сообщение в чат %s не отправлено: %s %s",
+                result.tg_chat_id,
+                result.status_code,
+                result.error,
+            )
+    return results
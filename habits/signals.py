@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from habits.feed_cache import bump_public_version
+from habits.models import Habit
+from habits.schedule import (register_timezone, sync_habit_schedule,
+                             sync_user_schedule)
+
+SCHEDULE_FIELDS = ("is_pleasant", "periodicity_type", "weekdays", "time")
+
+
+@receiver(post_save, sender=Habit)
+def update_habit_schedule(sender, instance, created, update_fields=None, **kwargs):
+    """Обновляет расписание напоминаний, если изменились поля, от которых оно зависит"""
+    if update_fields is not None and not set(SCHEDULE_FIELDS) & set(update_fields):
+        return
+    if created or instance.has_changed(*SCHEDULE_FIELDS):
+        sync_habit_schedule(instance)
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_public_feed(sender, instance, **kwargs):
+    """Сбрасывает кэш ленты, если привычка публичная или перестала быть публичной
+
+    Версия меняется после коммита, иначе запрос, прочитавший ленту до
+    коммита, закэшировал бы старые данные под новой версией.
+    """
+    if instance.is_public or instance.get_loaded_value("is_public"):
+        transaction.on_commit(bump_public_version)
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_public_feed_on_delete(sender, instance, **kwargs):
+    """Сбрасывает кэш ленты при удалении публичной привычки
+
+    Удаление приятной привычки тоже меняет ленту: у ссылающихся на неё
+    публичных привычек очищается связанная привычка.
+    """
+    if instance.is_public or instance.is_pleasant:
+        transaction.on_commit(bump_public_version)
+
+
+@receiver(post_save, sender=get_user_model())
+def update_user_schedule(sender, instance, created, update_fields=None, **kwargs):
+    """Переносит расписание привычек пользователя при смене часового пояса"""
+    if created:
+        register_timezone(instance.timezone)
+    elif update_fields is None or "timezone" in update_fields:
+        sync_user_schedule(instance)
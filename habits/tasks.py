@@ -1,44 +1,355 @@
-from celery import shared_task
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+from time import monotonic, time
+
+from celery import group, shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Mod
 from django.utils.timezone import now
 
-from habits.models import Habit
-from habits.services import send_telegram_message
+from habit_reminder.metrics import (DELIVERY_LAG, REMINDERS_DEFERRED,
+                                    REMINDERS_DUE, REMINDERS_FAILED,
+                                    REMINDERS_SENT)
+from habits.models import ReminderDelivery, ReminderSlot, SchedulerWatermark
+from habits.ratelimit import (acquire_send_slot, pause_sending, track_deferred,
+                              track_delivery_lag, track_resumed)
+from habits.schedule import get_active_timezones, get_local_slots
+from habits.services import (build_reminder_message, coalesce_messages,
+                             send_telegram_messages)
+
+logger = get_task_logger(__name__)
+
+WATERMARK_NAME = "check_habits"
+TICK_LOCK_TIMEOUT = 2 * 60
+
+
+def chunked(items, size):
+    """Делит последовательность на части длиной не больше size"""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def filter_shard(queryset, user_field, shard, shard_count):
+    """Оставляет записи пользователей, попадающих в шард shard из shard_count"""
+    if shard_count == 1:
+        return queryset
+    return queryset.alias(shard=Mod(user_field, shard_count)).filter(shard=shard)
+
+
+def select_due_reminders(minutes, shard=0, shard_count=1):
+    """Наступившие напоминания (привычка, время) для минут minutes
+
+    Время привычек сравнивается с местным временем владельца: для каждого
+    часового пояса пользователей вычисляются местные минуты недели, и слоты
+    выбираются по индексу (часовой пояс, минута недели).
+    """
+    local_slots = get_local_slots(minutes, get_active_timezones())
+    if not local_slots:
+        return
+
+    slots_by_timezone = defaultdict(list)
+    for timezone, slot in local_slots:
+        slots_by_timezone[timezone].append(slot)
+    lookup = Q()
+    for timezone, slots in slots_by_timezone.items():
+        lookup |= Q(timezone=timezone, slot__in=slots)
+    due = (
+        ReminderSlot.objects.filter(lookup, habit__user__tg_chat_id__isnull=False)
+        .exclude(habit__user__tg_chat_id="")
+        .order_by()
+        .values_list("timezone", "slot", "habit_id")
+    )
+    due = filter_shard(due, "habit__user_id", shard, shard_count)
+    for timezone, slot, habit_id in due.iterator(
+        chunk_size=settings.REMINDER_QUERY_CHUNK_SIZE
+    ):
+        yield habit_id, local_slots[(timezone, slot)]
+
+
+def record_due_reminders(moment, shard=0, shard_count=1):
+    """Заносит в журнал доставки напоминания с последней отметки до moment
+
+    Возвращает идентификаторы записей журнала, переданных на отправку.
+    Отметка и журнал меняются в одной транзакции, поэтому повторный или
+    параллельный запуск не поставит одно напоминание в очередь дважды,
+    а после простоя пропущенные минуты догоняются одним запросом.
+    У каждого шарда своя отметка, шард обрабатывает только привычки
+    пользователей с user_id % shard_count == shard.
+
+    Записи, переданные на отправку больше REMINDER_REQUEUE_MINUTES минут
+    назад и так и не отправленные (задача не дошла до брокера или потерялась),
+    передаются на отправку снова. Отправит их только та задача, которая
+    первой займёт записи в deliver_messages().
+
+    Слоты читаются из основной базы: отметка сдвигается по ним, и слот,
+    ещё не дошедший до отстающей реплики, был бы пропущен навсегда.
+    """
+    moment = moment.replace(second=0, microsecond=0)
+    horizon = moment - timedelta(minutes=settings.REMINDER_MAX_CATCHUP_MINUTES)
+    name = WATERMARK_NAME
+    if shard_count > 1:
+        name = f"{WATERMARK_NAME}:{shard}/{shard_count}"
+    with transaction.atomic():
+        watermark, _ = SchedulerWatermark.objects.select_for_update().get_or_create(
+            name=name, defaults={"processed_until": moment - timedelta(minutes=1)}
+        )
+        start = max(watermark.processed_until + timedelta(minutes=1), horizon)
+        minutes = []
+        while start <= moment:
+            minutes.append(start)
+            start += timedelta(minutes=1)
+        if not minutes:
+            return []
+
+        ReminderDelivery.objects.bulk_create(
+            (
+                ReminderDelivery(habit_id=habit_id, scheduled_at=scheduled_at)
+                for habit_id, scheduled_at in select_due_reminders(
+                    minutes, shard, shard_count
+                )
+            ),
+            batch_size=settings.REMINDER_QUERY_CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+        watermark.processed_until = moment
+        watermark.save(update_fields=["processed_until"])
+
+        stale = moment - timedelta(minutes=settings.REMINDER_REQUEUE_MINUTES)
+        pending = ReminderDelivery.objects.select_for_update(
+            skip_locked=True, of=("self",)
+        ).filter(
+            Q(status=ReminderDelivery.Status.PENDING)
+            | Q(status=ReminderDelivery.Status.QUEUED, queued_at__lte=stale),
+            scheduled_at__gte=horizon,
+        )
+        delivery_ids = list(
+            filter_shard(pending, "habit__user_id", shard, shard_count)
+            .order_by("habit__user_id")
+            .values_list("id", flat=True)
+        )
+        ReminderDelivery.objects.filter(id__in=delivery_ids).update(
+            status=ReminderDelivery.Status.QUEUED, queued_at=moment
+        )
+    return delivery_ids
 
 
 @shared_task
-def check_habits():
-    """Проверяет привычки и отправляет сообщение, если подходит время их выполнения"""
-    current_time = now().time()
-    current_date = now().date()
-    current_weekday = current_date.weekday() + 1
+def check_habits(shard=0, shard_count=1):
+    """Находит напоминания, время которых наступило, и раздаёт их отправку воркерам
 
-    current_hour = current_time.hour
-    current_minute = current_time.minute
+    Каждый шард выполняется не больше одного раза за минуту: повторный запуск
+    того же шарда на другом узле отсекается блокировкой в Redis.
+    """
+    moment = now()
+    lock_key = f"habits:check_habits:{shard}/{shard_count}:{moment:%Y%m%d%H%M}"
+    if not cache.add(lock_key, 1, timeout=TICK_LOCK_TIMEOUT):
+        logger.info("Шард %s/%s уже обработан в эту минуту", shard, shard_count)
+        return {"reminders": 0, "chunks": 0, "skipped": True}
 
-    daily_habits = Habit.objects.filter(
-        periodicity_type=Habit.Periodicity.DAILY, is_pleasant=False
+    delivery_ids = record_due_reminders(moment, shard, shard_count)
+    REMINDERS_DUE.inc(len(delivery_ids))
+    chunks = list(chunked(delivery_ids, settings.REMINDER_DELIVERY_CHUNK_SIZE))
+    if chunks:
+        group(deliver_reminders.s(chunk) for chunk in chunks).apply_async()
+    logger.info(
+        "Шард %s/%s: напоминаний к отправке %s, пакетов %s",
+        shard,
+        shard_count,
+        len(delivery_ids),
+        len(chunks),
     )
-    for habit in daily_habits:
-        habit_hour = habit.time.hour
-        habit_minute = habit.time.minute
+    return {"reminders": len(delivery_ids), "chunks": len(chunks)}
 
-        if habit_hour == current_hour and habit_minute == current_minute:
-            message = f"Я буду {habit.action} в {habit.time.strftime('%H:%M')} в {habit.place}"
-            if habit.user.tg_chat_id:
-                send_telegram_message(message, habit.user.tg_chat_id)
 
-    weekly_habits = Habit.objects.filter(
-        periodicity_type=Habit.Periodicity.WEEKLY, is_pleasant=False
+@shared_task(acks_late=True)
+def deliver_reminders(delivery_ids):
+    """Отправляет пакет напоминаний из журнала доставки"""
+    started = monotonic()
+    reminders = (
+        ReminderDelivery.objects.filter(
+            id__in=delivery_ids, status=ReminderDelivery.Status.QUEUED
+        )
+        .order_by()
+        .values_list(
+            "id",
+            "scheduled_at",
+            "habit__action",
+            "habit__time",
+            "habit__place",
+            "habit__user__tg_chat_id",
+        )
+        .iterator(chunk_size=settings.REMINDER_QUERY_CHUNK_SIZE)
     )
-    for habit in weekly_habits:
-        habit_hour = habit.time.hour
-        habit_minute = habit.time.minute
-
-        if (
-            current_weekday in (habit.weekdays or [])
-            and habit_hour == current_hour
-            and habit_minute == current_minute
-        ):
-            message = f"Я буду {habit.action} в {habit.time.strftime('%H:%M')} в {habit.place}"
-            if habit.user.tg_chat_id:
-                send_telegram_message(message, habit.user.tg_chat_id)
+    messages = [
+        {
+            "text": build_reminder_message(action, time, place),
+            "tg_chat_id": tg_chat_id,
+            "scheduled_at": scheduled_at.timestamp(),
+            "delivery_ids": [delivery_id],
+        }
+        for delivery_id, scheduled_at, action, time, place, tg_chat_id in reminders
+    ]
+    if settings.TELEGRAM_COALESCE_REMINDERS:
+        messages = coalesce_messages(messages)
+    stats = deliver_messages(messages)
+    elapsed = monotonic() - started
+    logger.info(
+        "Пакет напоминаний: записей %s, отправлено %s, ошибок %s, отложено %s за %.3f с",
+        len(delivery_ids),
+        stats["sent"],
+        stats["failed"],
+        stats["deferred"],
+        elapsed,
+    )
+    return {"reminders": len(delivery_ids), **stats, "elapsed": elapsed}
+
+
+def get_delivery_ids(messages):
+    return [
+        delivery_id for message in messages for delivery_id in message["delivery_ids"]
+    ]
+
+
+def claim_deliveries(messages):
+    """Занимает записи журнала под отправку и возвращает их идентификаторы
+
+    Условный UPDATE переводит в SENDING только записи в статусе QUEUED,
+    поэтому одну запись отправит только одна задача, даже если она попала
+    и в отложенный пакет, и в повторную раздачу после простоя.
+    """
+    delivery_ids = get_delivery_ids(messages)
+    if not delivery_ids:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {ReminderDelivery._meta.db_table} SET status = %s "
+            "WHERE id = ANY(%s::bigint[]) AND status = %s RETURNING id",
+            [
+                ReminderDelivery.Status.SENDING,
+                delivery_ids,
+                ReminderDelivery.Status.QUEUED,
+            ],
+        )
+        return {delivery_id for delivery_id, in cursor.fetchall()}
+
+
+def mark_deliveries(messages, status):
+    """Отмечает в журнале доставки результат отправки занятых сообщений
+
+    Отложенные сообщения возвращаются в QUEUED с новым временем передачи на
+    отправку, чтобы повторная раздача не взяла их, пока жив отложенный пакет.
+    Возвращает число отмеченных записей.
+    """
+    delivery_ids = get_delivery_ids(messages)
+    if not delivery_ids:
+        return 0
+    moment = now()
+    fields = {"status": status}
+    if status == ReminderDelivery.Status.SENT:
+        fields["sent_at"] = moment
+    elif status == ReminderDelivery.Status.QUEUED:
+        fields["queued_at"] = moment
+    return ReminderDelivery.objects.filter(
+        id__in=delivery_ids, status=ReminderDelivery.Status.SENDING
+    ).update(**fields)
+
+
+@shared_task(acks_late=True)
+def deliver_messages(messages, resumed=False):
+    """Отправляет сообщения с учётом лимитов Telegram
+
+    Сообщения, которые сейчас нельзя отправить из-за лимитов или ответа 429,
+    ставятся обратно в очередь с задержкой. Отправляются только сообщения,
+    все записи журнала которых удалось занять: остальные уже отправлены или
+    отправляются другой задачей. Запись, занятая задачей, которая не
+    завершилась, остаётся в SENDING и повторно не отправляется. Доставка
+    длинного текста завершается последней частью, а ошибка любой части
+    отмечает её неудачной.
+    """
+    if resumed:
+        track_resumed(len(messages))
+
+    claimed = claim_deliveries(messages)
+    claimable = []
+    skipped = []
+    for message in messages:
+        if claimed.issuperset(message["delivery_ids"]):
+            claimable.append(message)
+        else:
+            skipped.append(message)
+    if skipped:
+        # Часть записей уже взята другой задачей: текст целиком отправлять нельзя,
+        # занятые этой задачей записи возвращаются в очередь
+        ReminderDelivery.objects.filter(
+            id__in=claimed.intersection(get_delivery_ids(skipped))
+        ).update(status=ReminderDelivery.Status.QUEUED)
+        logger.info("Пропущено сообщений, записи которых заняты: %s", len(skipped))
+
+    ready = []
+    deferred = defaultdict(list)
+    held = {}
+    for message in claimable:
+        # Следующая часть текста не обгоняет отложенную предыдущую
+        delay = max(
+            (held.get(delivery_id, 0) for delivery_id in message["delivery_ids"]),
+            default=0,
+        )
+        delay = delay or acquire_send_slot(message["tg_chat_id"])
+        if delay:
+            deferred[delay].append(message)
+            if message.get("partial"):
+                held.update(dict.fromkeys(message["delivery_ids"], delay))
+        else:
+            ready.append(message)
+
+    results = send_telegram_messages(
+        [(message["text"], message["tg_chat_id"]) for message in ready]
+    )
+    sent = []
+    failed = []
+    for message, result in zip(ready, results):
+        if result.ok:
+            sent.append(message)
+        elif result.retry_after:
+            pause_sending(result.retry_after)
+            deferred[result.retry_after].append(message)
+        else:
+            failed.append(message)
+
+    later_ids = set()
+    for batch in reversed(list(deferred.values())):
+        for message in reversed(batch):
+            if message.get("partial") and later_ids.isdisjoint(message["delivery_ids"]):
+                # Следующие части текста уже обработаны: доставку завершит эта часть
+                del message["partial"]
+            later_ids.update(message["delivery_ids"])
+
+    # Ошибка или отложенная часть текста не дают отметить доставку отправленной
+    REMINDERS_FAILED.inc(mark_deliveries(failed, ReminderDelivery.Status.FAILED))
+    for batch in deferred.values():
+        mark_deliveries(batch, ReminderDelivery.Status.QUEUED)
+    delivered = [message for message in sent if not message.get("partial")]
+    REMINDERS_SENT.inc(mark_deliveries(delivered, ReminderDelivery.Status.SENT))
+    if delivered:
+        track_delivery_lag(
+            time() - min(message["scheduled_at"] for message in delivered)
+        )
+    sent_at = time()
+    for message in delivered:
+        DELIVERY_LAG.observe(sent_at - message["scheduled_at"])
+    for delay, batch in deferred.items():
+        track_deferred(len(batch))
+        REMINDERS_DEFERRED.inc(len(batch))
+        deliver_messages.apply_async((batch, True), countdown=delay)
+
+    return {
+        "sent": len(sent),
+        "failed": len(failed),
+        "deferred": sum(len(batch) for batch in deferred.values()),
+    }
@@ -1,8 +1,50 @@
+import csv
+import json
+import resource
+import tempfile
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from kombu.exceptions import OperationalError
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (APIClient, APIRequestFactory, APITestCase,
+                                 APITransactionTestCase)
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from habits.models import Habit
+from habit_reminder.celery import app as celery_app
+from habit_reminder.db import get_pool_metrics
+from habit_reminder.metrics import REGISTRY
+from habit_reminder.routers import get_replica, reading_from
+from habits.feed_cache import get_public_version
+from habits.models import Habit, ReminderDelivery, ReminderSlot
+from habits.paginators import HabitCursorPagination
+from habits.ratelimit import acquire_send_slot, get_delivery_metrics
+from habits.renderers import ORJSONRenderer
+from habits.schedule import get_local_slots, get_slot
+from habits.serializers import HabitListSerializer, HabitSerializer
+from habits.services import (DeliveryResult, coalesce_messages,
+                             send_telegram_messages)
+from habits.tasks import (check_habits, deliver_messages, deliver_reminders,
+                          record_due_reminders, select_due_reminders)
+from users.authentication import local_users
 
 
 class HabitViewSetTestCase(APITestCase):
@@ -100,6 +142,309 @@ class HabitViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 0)
 
+    def test_list_habits_by_cursor(self):
+        """Тест на постраничный обход привычек по курсору"""
+        self.client.force_authenticate(user=self.user1)
+        habits = Habit.objects.bulk_create(
+            Habit(
+                user=self.user1,
+                place="Парк",
+                time="07:30:00",
+                action=f"Бегать {i}",
+                duration=60,
+            )
+            for i in range(7)
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/habits/", {"page_size": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 4)
+
+        response = self.client.get(response.data["next"])
+        ids = [habit["id"] for habit in response.data["results"]]
+        self.assertEqual(ids, [habit.id for habit in habits[4:]])
+        self.assertIsNone(response.data["next"])
+
+    def test_list_habits_page_size_limit(self):
+        """Тест на ограничение размера страницы"""
+        self.client.force_authenticate(user=self.user1)
+        Habit.objects.bulk_create(
+            Habit(
+                user=self.user1,
+                place="Парк",
+                time="07:30:00",
+                action="Бегать",
+                duration=60,
+            )
+            for _ in range(HabitCursorPagination.max_page_size + 1)
+        )
+
+        response = self.client.get("/habits/", {"page_size": 1000})
+        self.assertEqual(
+            len(response.data["results"]), HabitCursorPagination.max_page_size
+        )
+
+
+class HabitDetailQueriesTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        self.pleasant = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time="21:00:00",
+            action="Ванна",
+            is_pleasant=True,
+            duration=60,
+        )
+        self.habit = Habit.objects.create(
+            user=self.user, place="Парк", time="07:00:00", action="Бег", duration=60
+        )
+        self.data = {
+            "place": "Лес",
+            "time": "07:00:00",
+            "action": "Бег",
+            "duration": 60,
+            "related_habit": self.pleasant.id,
+        }
+        # Пользователь запроса загружен заново, как при аутентификации
+        self.client.force_authenticate(
+            user=get_user_model().objects.get(pk=self.user.pk)
+        )
+        self.url = f"/habits/{self.habit.id}/"
+
+    def test_retrieve(self):
+        """Тест, что чтение привычки - один запрос"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_foreign_habit(self):
+        """Тест, что чужая привычка не находится тем же одним запросом"""
+        other = get_user_model().objects.create_user(username="other", password="1")
+        self.client.force_authenticate(user=other)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_without_schedule_change(self):
+        """Тест, что обновление без смены расписания его не пересчитывает"""
+        with self.assertNumQueries(3):
+            response = self.client.put(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(2):
+            response = self.client.patch(self.url, {"place": "Сад"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_with_schedule_change(self):
+        """Тест, что смена времени пересчитывает расписание без загрузки владельца"""
+        with self.assertNumQueries(6):
+            response = self.client.patch(self.url, {"time": "08:00"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(
+                ReminderSlot.objects.filter(habit=self.habit).values_list(
+                    "slot", flat=True
+                )
+            ),
+            {get_slot(weekday, time(8)) for weekday in range(1, 8)},
+        )
+
+    def test_schedule_follows_repeated_saves(self):
+        """Тест, что расписание следует за каждым сохранением одного экземпляра"""
+        habit = Habit.objects.get(pk=self.habit.pk)
+        habit.periodicity_type = Habit.Periodicity.WEEKLY
+        habit.weekdays = [1]
+        habit.save()
+        habit.weekdays.append(2)
+        habit.save()
+        habit.time = time(8)
+        habit.save()
+        habit.time = time(7)
+        habit.save()
+
+        self.assertEqual(
+            set(
+                ReminderSlot.objects.filter(habit=habit).values_list("slot", flat=True)
+            ),
+            {get_slot(1, time(7)), get_slot(2, time(7))},
+        )
+
+    def test_destroy(self):
+        """Тест на число запросов при удалении привычки"""
+        with self.assertNumQueries(5):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ReminderSlot.objects.filter(habit_id=self.habit.id).exists())
+
+
+@override_settings(HABITS_BULK_MAX_SIZE=5)
+class HabitBulkTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username="other", password="12345678"
+        )
+        self.pleasant = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time="21:00:00",
+            action="Ванна",
+            is_pleasant=True,
+            duration=60,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def get_habit_data(self, number, **kwargs):
+        return {
+            "place": "Парк",
+            "time": f"07:{number:02}:00",
+            "action": f"Бегать {number}",
+            "duration": 60,
+            "related_habit": self.pleasant.id,
+            **kwargs,
+        }
+
+    def test_bulk_create(self):
+        """Тест на создание нескольких привычек одним запросом"""
+        data = [self.get_habit_data(number) for number in range(5)]
+        with self.assertNumQueries(8):
+            response = self.client.post("/habits/bulk/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 5)
+        habits = Habit.objects.filter(user=self.user, is_pleasant=False)
+        self.assertEqual(habits.count(), 5)
+        self.assertEqual(
+            {habit["related_habit"] for habit in response.data}, {self.pleasant.id}
+        )
+        self.assertEqual(ReminderSlot.objects.filter(habit__in=habits).count(), 35)
+
+    def test_bulk_create_errors(self):
+        """Тест на ошибки по каждому элементу при массовом создании"""
+        data = [
+            self.get_habit_data(0),
+            self.get_habit_data(1, duration=600),
+            self.get_habit_data(2, related_habit=10**9),
+        ]
+        response = self.client.post("/habits/bulk/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("duration", response.data[1])
+        self.assertIn("related_habit", response.data[2])
+        self.assertEqual(Habit.objects.count(), 1)
+
+    def test_bulk_create_max_size(self):
+        """Тест на ограничение размера пачки"""
+        data = [self.get_habit_data(number) for number in range(6)]
+        response = self.client.post("/habits/bulk/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Habit.objects.count(), 1)
+
+    def test_bulk_update(self):
+        """Тест на обновление нескольких привычек одним запросом"""
+        habits = Habit.objects.bulk_create(
+            Habit(
+                user=self.user, place="Парк", time="07:00:00", action="Бег", duration=60
+            )
+            for _ in range(3)
+        )
+        data = [
+            {"id": habit.id, "time": "08:00:00", "is_public": False} for habit in habits
+        ]
+        response = self.client.patch("/habits/bulk/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(
+                Habit.objects.filter(id__in=[h.id for h in habits]).values_list(
+                    "time", "is_public"
+                )
+            ),
+            {(time(8), False)},
+        )
+        self.assertEqual(
+            set(
+                ReminderSlot.objects.filter(habit__in=habits).values_list(
+                    "slot", flat=True
+                )
+            ),
+            {get_slot(weekday, time(8)) for weekday in range(1, 8)},
+        )
+
+    def test_bulk_update_foreign_habit(self):
+        """Тест, что массово обновить можно только свои привычки"""
+        habit = Habit.objects.create(
+            user=self.other_user,
+            place="Парк",
+            time="07:00:00",
+            action="Бег",
+            duration=60,
+        )
+        response = self.client.patch(
+            "/habits/bulk/", [{"id": habit.id, "place": "Лес"}], format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("id", response.data[0])
+        habit.refresh_from_db()
+        self.assertEqual(habit.place, "Парк")
+
+    def test_bulk_update_invalid_payload(self):
+        """Тест на ошибку 400 для пачки, которая не список или слишком велика"""
+        habit = Habit.objects.create(
+            user=self.user, place="Парк", time="07:00:00", action="Бег", duration=60
+        )
+        for data in (5, {"id": habit.id}, [{"id": habit.id}] * 6):
+            with self.subTest(data=data):
+                response = self.client.put("/habits/bulk/", data, format="json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch(
+            "/habits/bulk/", [{"id": habit.id + 0.5, "place": "Лес"}], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("id", response.data[0])
+
+    def test_bulk_destroy(self):
+        """Тест на удаление нескольких привычек по списку id"""
+        habits = Habit.objects.bulk_create(
+            Habit(
+                user=self.user, place="Парк", time="07:00:00", action="Бег", duration=60
+            )
+            for _ in range(3)
+        )
+        foreign = Habit.objects.create(
+            user=self.other_user,
+            place="Парк",
+            time="07:00:00",
+            action="Бег",
+            duration=60,
+        )
+
+        response = self.client.delete(
+            "/habits/bulk/", [habits[0].id, foreign.id], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("id", response.data[1])
+
+        response = self.client.delete(
+            "/habits/bulk/", [habit.id for habit in habits], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Habit.objects.count(), 2)
+
 
 class HabitValidationTestCase(APITestCase):
     def setUp(self):
@@ -209,8 +554,481 @@ class HabitValidationTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class RelatedHabitFieldTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username="other", password="12345678"
+        )
+        self.pleasant_habits = [
+            Habit.objects.create(
+                user=self.user,
+                place="Дом",
+                time="21:00:00",
+                action=f"Ванна {number}",
+                is_pleasant=True,
+                duration=60,
+            )
+            for number in range(3)
+        ]
+        self.request = APIRequestFactory().post("/habits/")
+        self.request.user = self.user
+
+    def get_habit_data(self, related_habit):
+        return {
+            "place": "Парк",
+            "time": "07:30:00",
+            "action": "Бегать",
+            "duration": 60,
+            "related_habit": related_habit.id,
+        }
+
+    def test_single_query_for_many(self):
+        """Тест, что связанные привычки всех элементов загружаются одним запросом"""
+        data = [self.get_habit_data(habit) for habit in self.pleasant_habits * 2]
+        serializer = HabitSerializer(
+            data=data, many=True, context={"request": self.request}
+        )
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(
+            [item["related_habit"] for item in serializer.validated_data],
+            self.pleasant_habits * 2,
+        )
+
+    def test_only_own_pleasant_habits(self):
+        """Тест, что связанной может быть только своя приятная привычка"""
+        useful = Habit.objects.create(
+            user=self.user, place="Парк", time="07:00:00", action="Бег", duration=60
+        )
+        foreign = Habit.objects.create(
+            user=self.other_user,
+            place="Дом",
+            time="21:00:00",
+            action="Ванна",
+            is_pleasant=True,
+            duration=60,
+        )
+        for habit in (useful, foreign):
+            serializer = HabitSerializer(
+                data=self.get_habit_data(habit), context={"request": self.request}
+            )
+            self.assertFalse(serializer.is_valid())
+            self.assertIn("related_habit", serializer.errors)
+
+
+class HabitFilterTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        self.morning_run = Habit.objects.create(
+            user=self.user,
+            place="Парк у дома",
+            time="07:30:00",
+            action="Бегать трусцой",
+            duration=60,
+            periodicity_type="WEEKLY",
+            weekdays=[1, 3],
+        )
+        self.bath = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time="21:00:00",
+            action="Принять ванну",
+            is_pleasant=True,
+            duration=60,
+            is_public=False,
+        )
+        self.lunch = Habit.objects.create(
+            user=self.user,
+            place="Офис",
+            time="13:00:00",
+            action="Пообедать без телефона",
+            duration=30,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def get_ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [habit["id"] for habit in response.data["results"]]
+
+    def test_filters(self):
+        """Тест на фильтры по параметрам запроса"""
+        all_ids = [self.morning_run.id, self.bath.id, self.lunch.id]
+        cases = (
+            ({"periodicity_type": "WEEKLY"}, [self.morning_run.id]),
+            ({"is_pleasant": "true"}, [self.bath.id]),
+            ({"is_pleasant": "false"}, [self.morning_run.id, self.lunch.id]),
+            ({"weekday": "3"}, all_ids),
+            ({"weekday": "2"}, [self.bath.id, self.lunch.id]),
+            ({"time_from": "12:00", "time_to": "20:00"}, [self.lunch.id]),
+            ({"search": "бегать"}, [self.morning_run.id]),
+            ({"search": "парке"}, [self.morning_run.id]),
+            ({"search": "ванна"}, [self.bath.id]),
+            ({"search": "офис -телефон"}, []),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.get_ids("/habits/", **params), expected)
+
+    def test_public_filters(self):
+        """Тест на фильтры в ленте публичных привычек"""
+        self.assertEqual(
+            self.get_ids("/habits/public/", is_pleasant="false", search="телефона"),
+            [self.lunch.id],
+        )
+
+    def test_invalid_filters(self):
+        """Тест на ошибки в значениях фильтров"""
+        response = self.client.get(
+            "/habits/",
+            {"periodicity_type": "YEARLY", "weekday": "8", "time_from": "25:00"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            set(response.data), {"periodicity_type", "weekday", "time_from"}
+        )
+
+    def test_sparse_fields(self):
+        """Тест на выбор полей ответа параметром fields"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/habits/", {"fields": "time,action"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"][0],
+            {"time": "07:30:00", "action": "Бегать трусцой"},
+        )
+        select = queries.captured_queries[-1]["sql"].split(" FROM ")[0]
+        self.assertNotIn('"place"', select)
+        self.assertIn('"action"', select)
+
+        response = self.client.get("/habits/", {"fields": "action,password"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.data)
+
+
+def get_rss():
+    """Текущий объём резидентной памяти процесса в байтах"""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+class HabitExportTestCase(APITestCase):
+    rows = 1_000_000
+    peak_memory_limit = 50 * 1024 * 1024
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username="other", password="12345678"
+        )
+        self.habits = [
+            Habit.objects.create(
+                user=self.user,
+                place="Парк, у пруда",
+                time="07:30:00",
+                action='Бегать "трусцой"',
+                duration=60,
+                periodicity_type="WEEKLY",
+                weekdays=[1, 3],
+            ),
+            Habit.objects.create(
+                user=self.user,
+                place="Дом",
+                time="21:00:00",
+                action="Ванна",
+                is_pleasant=True,
+                duration=60,
+                is_public=False,
+            ),
+            Habit.objects.create(
+                user=self.other_user,
+                place="Офис",
+                time="13:00:00",
+                action="Обед",
+                duration=30,
+            ),
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_export_ndjson(self):
+        """Тест на выгрузку привычек пользователя в NDJSON"""
+        response = self.client.get("/habits/export/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        expected = HabitSerializer(self.habits[:2], many=True).data
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_export_csv(self):
+        """Тест на выгрузку ленты публичных привычек в CSV"""
+        response = self.client.get(
+            "/habits/public/export/",
+            {"export_format": "csv", "fields": "id,place,action,weekdays"},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(
+            list(csv.reader(StringIO(content))),
+            [
+                ["id", "place", "action", "weekdays"],
+                [
+                    str(self.habits[0].id),
+                    "Парк, у пруда",
+                    'Бегать "трусцой"',
+                    "1,3",
+                ],
+                [str(self.habits[2].id), "Офис", "Обед", ""],
+            ],
+        )
+
+    def test_export_unknown_format(self):
+        """Тест на ошибку при неизвестном формате выгрузки"""
+        response = self.client.get("/habits/export/", {"export_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_memory(self):
+        """Тест, что память при выгрузке не растёт с числом строк"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Habit._meta.db_table}
+                    (user_id, place, time, action, is_pleasant, duration,
+                     is_public, periodicity_type)
+                SELECT %s, 'Парк', '07:00', 'Бегать ' || number, false, 60,
+                    true, 'DAILY'
+                FROM generate_series(1, %s) AS number
+                """,
+                [self.user.id, self.rows],
+            )
+
+        baseline = peak = get_rss()
+        response = self.client.get("/habits/export/")
+        lines = 0
+        for chunk in response.streaming_content:
+            lines += chunk.count(b"\n")
+            peak = max(peak, get_rss())
+
+        self.assertEqual(lines, self.rows + 2)
+        self.assertLess(peak - baseline, self.peak_memory_limit)
+
+
+class ImportHabitsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        self.pleasant = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time="21:00:00",
+            action="Ванна",
+            is_pleasant=True,
+            duration=60,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def write_file(self, suffix, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / f"habits.{suffix}"
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_import_command(self):
+        """Тест на импорт привычек командой из NDJSON"""
+        rows = [
+            {"place": "Парк", "time": "07:00", "action": "Бегать", "duration": 60},
+            {"place": "Парк", "time": "07:00", "action": "Бегать", "duration": 60},
+            {"place": "Офис\tкабинет", "time": "13:00", "action": "Обед\\перерыв"},
+            {
+                "place": "Лес",
+                "time": "08:00",
+                "action": "Гулять",
+                "duration": 90,
+                "periodicity_type": "WEEKLY",
+                "weekdays": [2, 4],
+                "related_habit": self.pleasant.id,
+                "is_public": False,
+            },
+            {"place": "Парк", "time": "07:00", "action": "Йога", "duration": 600},
+        ]
+        content = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows)
+        path = self.write_file("ndjson", content + "\n{broken\n")
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command(
+            "import_habits",
+            str(path),
+            user="user",
+            batch_size=2,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        self.assertIn(
+            "Создано привычек: 2, уже были: 1, отклонено: 3", stdout.getvalue()
+        )
+        self.assertEqual(
+            [line.split(":")[0] for line in stderr.getvalue().splitlines()],
+            ["Строка 3", "Строка 5", "Строка 6"],
+        )
+        walk = Habit.objects.get(action="Гулять")
+        self.assertEqual(walk.weekdays, [2, 4])
+        self.assertEqual(walk.related_habit, self.pleasant)
+        self.assertFalse(walk.is_public)
+        self.assertTrue(Habit.objects.get(action="Бегать").is_public)
+        self.assertEqual(
+            ReminderSlot.objects.filter(habit__user=self.user).count(), 7 + 2
+        )
+
+        call_command(
+            "import_habits", str(path), user="user", stdout=stdout, stderr=stderr
+        )
+        self.assertIn("Создано привычек: 0, уже были: 3", stdout.getvalue())
+
+    def test_import_special_characters(self):
+        """Тест, что COPY сохраняет спецсимволы без искажений"""
+        row = {
+            "place": "Офис\tкабинет\\1",
+            "time": "13:00",
+            "action": "Обед\nбез телефона",
+            "duration": 30,
+            "reward": "",
+        }
+        path = self.write_file("ndjson", json.dumps(row, ensure_ascii=False))
+        call_command("import_habits", str(path), user="user", stdout=StringIO())
+
+        habit = Habit.objects.get(duration=30)
+        self.assertEqual(habit.place, row["place"])
+        self.assertEqual(habit.action, row["action"])
+        self.assertEqual(habit.reward, "")
+
+    def test_import_api_csv(self):
+        """Тест на импорт привычек из CSV через API"""
+        content = (
+            "place,time,action,duration,periodicity_type,weekdays,related_habit\n"
+            'Парк,07:00,"Бегать, быстро",60,WEEKLY,"1,3",%s\n'
+            "Офис,13:00,Обед,200,DAILY,,\n" % self.pleasant.id
+        )
+        upload = SimpleUploadedFile("habits.csv", content.encode(), "text/csv")
+
+        response = self.client.post("/habits/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["rejected"][0]["line"], 3)
+        self.assertIn("duration", response.data["rejected"][0]["errors"])
+        habit = Habit.objects.get(action="Бегать, быстро")
+        self.assertEqual(habit.weekdays, [1, 3])
+        self.assertEqual(habit.related_habit_id, self.pleasant.id)
+
+    @override_settings(HABITS_IMPORT_BATCH_SIZE=1)
+    def test_import_api_invalid_encoding(self):
+        """Тест, что при ошибке кодировки ответ сообщает об уже загруженных пачках"""
+        version = get_public_version()
+        content = (
+            "place,time,action,duration,is_public\n"
+            "Парк,07:00,Бегать,60,true\n".encode()
+            + "Офис,13:00,Обед,60,false\n".encode("cp1251")
+        )
+        upload = SimpleUploadedFile("habits.csv", content, "text/csv")
+
+        response = self.client.post("/habits/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["file"], ["Файл должен быть в UTF-8"])
+        self.assertEqual(response.data["created"], 1)
+        self.assertTrue(Habit.objects.filter(action="Бегать").exists())
+        self.assertNotEqual(get_public_version(), version)
+
+        path = self.write_file("csv", "")
+        path.write_bytes(content)
+        with self.assertRaisesMessage(CommandError, "Файл должен быть в UTF-8"):
+            call_command("import_habits", str(path), user="user", stdout=StringIO())
+
+    def test_import_api_unknown_format(self):
+        """Тест на ошибку при неизвестном формате файла"""
+        upload = SimpleUploadedFile("habits.xml", b"<habits/>")
+        response = self.client.post("/habits/import/", {"file": upload})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HabitListSerializerTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user", password="12345678"
+        )
+        pleasant = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time="21:00:00",
+            action="Ванна\u2028с пеной",
+            is_pleasant=True,
+            duration=60,
+            is_public=False,
+        )
+        Habit.objects.create(
+            user=self.user,
+            place="Парк",
+            time="07:30:15.250000",
+            action='Бегать "быстро"',
+            duration=120,
+            periodicity_type="WEEKLY",
+            weekdays=[1, 3, 5],
+            related_habit=pleasant,
+        )
+        Habit.objects.create(
+            user=self.user,
+            place="Офис",
+            time="12:00:00",
+            action="Обед",
+            duration=30,
+            reward="Кофе",
+        )
+
+    def test_matches_model_serializer(self):
+        """Тест на совпадение с HabitSerializer до байта"""
+        expected = HabitSerializer(Habit.objects.all(), many=True).data
+        data = HabitListSerializer().serialize(
+            Habit.objects.values(*HabitListSerializer.columns)
+        )
+
+        self.assertEqual(data, expected)
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_list_response(self):
+        """Тест на совпадение ответа списка с ответом HabitSerializer"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/habits/", {"page_size": 10})
+
+        expected = HabitSerializer(Habit.objects.all(), many=True).data
+        self.assertEqual(response.data["results"], expected)
+        self.assertEqual(
+            json.loads(response.content)["results"], json.loads(json.dumps(expected))
+        )
+
+    def test_orjson_falls_back(self):
+        """Тест на откат к JSONRenderer для типов, которых не знает orjson"""
+        data = {"detail": ErrorDetail("Ошибка"), "value": Decimal("1.50")}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
 class PublicHabitListAPIViewTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = get_user_model().objects.create_user(
             username="user1", password="12345678"
         )
@@ -245,3 +1063,1102 @@ class PublicHabitListAPIViewTest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 1)
+
+    def test_public_habit_list_is_cached(self):
+        """Тест, что повторный запрос ленты обслуживается из кэша"""
+        self.client.force_authenticate(user=self.user1)
+        first = self.client.get("/habits/public/", format="json")
+
+        with self.assertNumQueries(0):
+            second = self.client.get("/habits/public/", format="json")
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_public_habit_list_not_modified(self):
+        """Тест на ответ 304 при совпадении ETag"""
+        self.client.force_authenticate(user=self.user1)
+        etag = self.client.get("/habits/public/", format="json")["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                "/habits/public/", format="json", HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_public_habit_list_invalidated(self):
+        """Тест на сброс кэша ленты при изменении публичных привычек"""
+        self.client.force_authenticate(user=self.user1)
+        etag = self.client.get("/habits/public/", format="json")["ETag"]
+
+        self.private_habit.is_public = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.private_habit.save()
+        response = self.client.get(
+            "/habits/public/", format="json", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+
+        habit = Habit.objects.get(pk=self.public_habit.pk)
+        habit.is_public = False
+        with self.captureOnCommitCallbacks(execute=True):
+            habit.save()
+        response = self.client.get("/habits/public/", format="json")
+        self.assertEqual(len(response.data["results"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.private_habit.delete()
+        response = self.client.get("/habits/public/", format="json")
+        self.assertEqual(len(response.data["results"]), 0)
+
+    def test_public_habit_list_invalidated_after_commit(self):
+        """Тест, что версия ленты меняется только после коммита"""
+        version = get_public_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.public_habit.action = "Плавание"
+            self.public_habit.save()
+            self.public_habit.delete()
+        self.assertEqual(get_public_version(), version)
+        self.assertEqual(len(callbacks), 2)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_public_version(), version)
+
+
+class AsyncHabitViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = get_user_model().objects.create(username="user1")
+        self.other_user = get_user_model().objects.create(username="user2")
+        self.habits = Habit.objects.bulk_create(
+            Habit(
+                user=self.user,
+                place="Парк",
+                time=time(7, minute),
+                action="Бегать",
+                duration=60,
+                is_public=minute % 2 == 0,
+            )
+            for minute in range(7)
+        )
+        self.other_habit = Habit.objects.create(
+            user=self.other_user,
+            place="Дом",
+            time=time(8),
+            action="Читать",
+            duration=60,
+            is_public=False,
+        )
+        self.headers = {
+            "Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        }
+        self.client.force_authenticate(user=self.user)
+
+    async def get(self, path, headers=None):
+        return await self.async_client.get(
+            path, headers={**self.headers, **(headers or {})}
+        )
+
+    async def test_list(self):
+        """Тест на совпадение асинхронного списка с синхронным"""
+        response = await self.get("/habits/async/?page_size=5&fields=id,action")
+        expected = await sync_to_async(self.client.get)(
+            "/habits/?page_size=5&fields=id,action"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["results"], expected.json()["results"])
+        self.assertIsNone(data["previous"])
+
+        response = await self.get(data["next"])
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            [habit.id for habit in self.habits[5:]],
+        )
+
+    async def test_list_filter(self):
+        """Тест на фильтры асинхронного списка"""
+        response = await self.get("/habits/async/?weekday=9")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("weekday", response.json())
+
+    async def test_unauthenticated(self):
+        """Тест на запрос без токена и с неверным токеном"""
+        response = await self.async_client.get("/habits/async/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("WWW-Authenticate", response)
+
+        response = await self.get("/habits/async/", {"Authorization": "Bearer token"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_retrieve(self):
+        """Тест на совпадение асинхронного просмотра с синхронным"""
+        habit = self.habits[0]
+        response = await self.get(f"/habits/async/{habit.id}/")
+        expected = await sync_to_async(self.client.get)(f"/habits/{habit.id}/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), expected.json())
+
+        response = await self.get(f"/habits/async/{self.other_habit.id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_public_list(self):
+        """Тест на асинхронную ленту публичных привычек с ETag"""
+        response = await self.get("/habits/async/public/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            [habit.id for habit in self.habits if habit.is_public],
+        )
+
+        response = await self.get(
+            "/habits/async/public/", {"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ConnectionPoolTestCase(APITestCase):
+    def test_pool_metrics(self):
+        """Тест на метрики пула соединений веб-процесса"""
+        Habit.objects.exists()
+        metrics = get_pool_metrics()
+
+        self.assertIsNotNone(connection.pool)
+        self.assertEqual(metrics["max_size"], settings.DB_POOL_MAX_SIZE)
+        self.assertGreaterEqual(metrics["in_use"], 1)
+        self.assertGreaterEqual(metrics["checkouts"], 1)
+        self.assertEqual(metrics["saturation"], metrics["in_use"] / metrics["max_size"])
+
+
+def get_sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user1", password="12345678"
+        )
+        Habit.objects.create(
+            user=self.user, place="Парк", time="07:30:00", action="Бегать", duration=60
+        )
+
+    def test_request_metrics(self):
+        """Тест на замеры запроса: время, запросы к базе и сериализация"""
+        labels = {"kind": "request", "name": "GET habits:habits-list"}
+        count = get_sample("habit_reminder_duration_seconds_count", labels)
+        queries = get_sample("habit_reminder_db_queries_sum", labels)
+        serializer = get_sample(
+            "habit_reminder_serializer_duration_seconds_sum", labels
+        )
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get("/habits/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            get_sample("habit_reminder_duration_seconds_count", labels), count + 1
+        )
+        self.assertGreaterEqual(
+            get_sample("habit_reminder_db_queries_sum", labels), queries + 1
+        )
+        self.assertGreater(
+            get_sample("habit_reminder_serializer_duration_seconds_sum", labels),
+            serializer,
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint(self):
+        """Тест на выдачу метрик только с токеном"""
+        self.client.get("/habits/public/")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.content.decode()
+        self.assertIn('habit_reminder_duration_seconds_count{kind="request"', content)
+        self.assertIn("habit_reminder_queue_depth", content)
+        self.assertIn(
+            'habit_reminder_db_pool{alias="default",metric="in_use"}', content
+        )
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_without_token(self):
+        """Тест, что без токена метрики закрыты, если не включён DEBUG"""
+        with self.settings(DEBUG=False):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with self.settings(DEBUG=True):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTestCase(APITransactionTestCase):
+    """Чтения из реплики на втором соединении к той же тестовой базе"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        default = connections["default"]
+        connections["replica"] = default.__class__(
+            {**default.settings_dict, "OPTIONS": {}}, alias="replica"
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username="user1")
+        self.client.force_authenticate(user=self.user)
+        self.data = {
+            "place": "Парк",
+            "time": "07:00:00",
+            "action": "Бегать",
+            "duration": 60,
+            "periodicity_type": "DAILY",
+        }
+
+    def get_list(self, path="/habits/"):
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_list_reads_replica(self):
+        """Тест на чтение списка привычек из реплики"""
+        Habit.objects.create(user=self.user, **self.data)
+        cache.clear()
+
+        response, replica_queries = self.get_list()
+
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(replica_queries, 1)
+
+    def test_read_your_writes(self):
+        """Тест на чтение из основной базы сразу после записи пользователя"""
+        response = self.client.post("/habits/", self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response, replica_queries = self.get_list()
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(replica_queries, 0)
+
+        # Окно после записи истекло
+        cache.clear()
+        response, replica_queries = self.get_list()
+        self.assertEqual(replica_queries, 1)
+
+    def test_other_user_reads_replica(self):
+        """Тест, что запись одного пользователя не отключает реплику другому"""
+        self.client.post("/habits/", {**self.data, "is_public": False}, format="json")
+        other_user = get_user_model().objects.create(username="user2")
+        self.client.force_authenticate(user=other_user)
+
+        _, replica_queries = self.get_list()
+
+        self.assertEqual(replica_queries, 1)
+
+    def test_public_feed_after_change(self):
+        """Тест на чтение ленты из основной базы после изменения публичных привычек"""
+        Habit.objects.create(user=self.user, is_public=True, **self.data)
+
+        response, replica_queries = self.get_list("/habits/public/")
+
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(replica_queries, 0)
+
+    def test_schedule_reads_primary(self):
+        """Тест на выборку напоминаний только из основной базы"""
+        self.user.tg_chat_id = "123456789"
+        self.user.save()
+        Habit.objects.create(user=self.user, **self.data)
+        cache.clear()
+
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            delivery_ids = record_due_reminders(
+                datetime(2024, 12, 2, 7, 0, tzinfo=timezone.utc)
+            )
+
+        self.assertEqual(len(delivery_ids), 1)
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Тест на чтение из основной базы, если реплик нет"""
+        Habit.objects.create(user=self.user, **self.data)
+
+        _, replica_queries = self.get_list()
+
+        self.assertEqual(replica_queries, 0)
+        with reading_from(get_replica()):
+            self.assertEqual(Habit.objects.all().db, "default")
+
+
+class CheckHabitsTaskTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user1", password="12345678", tg_chat_id="123456789"
+        )
+        # Понедельник, 07:30 UTC
+        self.moment = datetime(2024, 12, 2, 7, 30, 15, tzinfo=timezone.utc)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+        cache.clear()
+
+    def create_habit(self, **kwargs):
+        data = {
+            "user": self.user,
+            "place": "Парк",
+            "time": "07:30:00",
+            "action": "Бегать",
+            "is_pleasant": False,
+            "duration": 60,
+            "periodicity_type": Habit.Periodicity.DAILY,
+        }
+        data.update(kwargs)
+        return Habit.objects.create(**data)
+
+    def patch_sender(self):
+        return patch(
+            "habits.tasks.send_telegram_messages",
+            side_effect=lambda messages: [
+                DeliveryResult(tg_chat_id, True, 200) for _, tg_chat_id in messages
+            ],
+        )
+
+    def test_check_habits_requeues_lost_dispatch(self):
+        """Тест на повторную отправку напоминаний, задача которых не дошла до брокера"""
+        habit = self.create_habit()
+
+        with patch("habits.tasks.now", return_value=self.moment), patch(
+            "habits.tasks.group"
+        ) as group:
+            group.return_value.apply_async.side_effect = OperationalError
+            with self.assertRaises(OperationalError):
+                check_habits()
+        delivery = ReminderDelivery.objects.get(habit=habit)
+        self.assertEqual(delivery.status, ReminderDelivery.Status.QUEUED)
+
+        with patch(
+            "habits.tasks.now", return_value=self.moment + timedelta(minutes=5)
+        ), self.patch_sender() as send:
+            check_habits()
+        send.assert_not_called()
+
+        with patch(
+            "habits.tasks.now", return_value=self.moment + timedelta(minutes=15)
+        ), self.patch_sender() as send:
+            check_habits()
+        send.assert_called_once_with([("Я буду Бегать в 07:30 в Парк", "123456789")])
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, ReminderDelivery.Status.SENT)
+
+    def test_deferred_batch_outliving_requeue_window(self):
+        """Тест, что отложенный пакет и повторная раздача не отправят напоминание дважды"""
+        habit = self.create_habit()
+        too_many = patch(
+            "habits.tasks.send_telegram_messages",
+            side_effect=lambda messages: [
+                DeliveryResult(tg_chat_id, False, 429, retry_after=5)
+                for _, tg_chat_id in messages
+            ],
+        )
+
+        def run(minutes, sender, task=check_habits, *args):
+            # Отложенные пакеты не выполняются сразу, а сохраняются
+            cache.clear()
+            with patch(
+                "habits.tasks.now",
+                return_value=self.moment + timedelta(minutes=minutes),
+            ), sender as send, patch.object(deliver_messages, "apply_async") as defer:
+                task(*args)
+            return send, [call.args[0][0] for call in defer.call_args_list]
+
+        _, (deferred,) = run(0, too_many)
+        # Отложенный пакет снова откладывается и продлевает время в очереди
+        _, (deferred,) = run(10, too_many, deliver_messages, deferred, True)
+        send, _ = run(20, self.patch_sender())
+        send.assert_not_called()
+
+        # Пакет потерялся: после окна повторной раздачи напоминание уходит один раз
+        send, _ = run(40, self.patch_sender())
+        send.assert_called_once()
+        send, _ = run(41, self.patch_sender(), deliver_messages, deferred, True)
+        send.assert_called_once_with([])
+        delivery = ReminderDelivery.objects.get(habit=habit)
+        self.assertEqual(delivery.status, ReminderDelivery.Status.SENT)
+
+    def test_split_reminder_failed_part(self):
+        """Тест, что ошибка первой части длинного напоминания не скрывается отправкой последней"""
+        habit = self.create_habit()
+        split = patch(
+            "habits.tasks.coalesce_messages",
+            side_effect=lambda messages: coalesce_messages(messages, limit=20),
+        )
+        sent = get_sample("habit_reminder_reminders_sent_total")
+
+        def run(results, task=check_habits, *args):
+            # Вторая часть ждёт интервала чата и откладывается
+            cache.clear()
+            with patch("habits.tasks.now", return_value=self.moment), split, patch(
+                "habits.tasks.send_telegram_messages", side_effect=results
+            ) as send, patch.object(deliver_messages, "apply_async") as defer:
+                task(*args)
+            return send, [call.args[0][0] for call in defer.call_args_list]
+
+        send, (deferred,) = run(
+            [[DeliveryResult("123456789", False, 400, "Bad Request")]]
+        )
+        send.assert_called_once_with([("Я буду Бегать в 07:3", "123456789")])
+        self.assertEqual(
+            ReminderDelivery.objects.get(habit=habit).status,
+            ReminderDelivery.Status.FAILED,
+        )
+
+        send, _ = run([[]], deliver_messages, deferred, True)
+        send.assert_called_once_with([])
+        self.assertEqual(
+            ReminderDelivery.objects.get(habit=habit).status,
+            ReminderDelivery.Status.FAILED,
+        )
+        self.assertEqual(get_sample("habit_reminder_reminders_sent_total"), sent)
+
+    def test_split_reminder_sent_by_last_part(self):
+        """Тест, что длинное напоминание отмечается отправленным только после последней части"""
+        habit = self.create_habit()
+        split = patch(
+            "habits.tasks.coalesce_messages",
+            side_effect=lambda messages: coalesce_messages(messages, limit=20),
+        )
+
+        def run(task=check_habits, *args):
+            cache.clear()
+            with patch(
+                "habits.tasks.now", return_value=self.moment
+            ), split, self.patch_sender() as send, patch.object(
+                deliver_messages, "apply_async"
+            ) as defer:
+                task(*args)
+            return send, [call.args[0][0] for call in defer.call_args_list]
+
+        _, (deferred,) = run()
+        self.assertEqual(
+            ReminderDelivery.objects.get(habit=habit).status,
+            ReminderDelivery.Status.QUEUED,
+        )
+
+        send, _ = run(deliver_messages, deferred, True)
+        send.assert_called_once_with([("0 в Парк", "123456789")])
+        self.assertEqual(
+            ReminderDelivery.objects.get(habit=habit).status,
+            ReminderDelivery.Status.SENT,
+        )
+
+    def test_check_habits_sends_messages(self):
+        """Тест на отправку напоминаний только по наступившим привычкам"""
+        self.create_habit()
+        self.create_habit(time="08:30:00")
+
+        with patch(
+            "habits.tasks.now", return_value=self.moment
+        ), self.patch_sender() as send:
+            check_habits()
+
+        send.assert_called_once_with([("Я буду Бегать в 07:30 в Парк", "123456789")])
+
+    def test_check_habits_metrics(self):
+        """Тест на метрики тика: напоминания к отправке, отправленные и задержка"""
+        self.create_habit()
+        self.create_habit(action="Отжиматься")
+        task = {"kind": "task", "name": "habits.tasks.check_habits"}
+        counts = {
+            "due": get_sample("habit_reminder_reminders_due_total"),
+            "sent": get_sample("habit_reminder_reminders_sent_total"),
+            "lag": get_sample("habit_reminder_delivery_lag_seconds_count"),
+            "task": get_sample("habit_reminder_duration_seconds_count", task),
+            "queries": get_sample("habit_reminder_db_queries_sum", task),
+        }
+
+        with patch("habits.tasks.now", return_value=self.moment), self.patch_sender():
+            check_habits.delay()
+
+        self.assertEqual(
+            get_sample("habit_reminder_reminders_due_total"), counts["due"] + 2
+        )
+        self.assertEqual(
+            get_sample("habit_reminder_reminders_sent_total"), counts["sent"] + 2
+        )
+        self.assertEqual(
+            get_sample("habit_reminder_delivery_lag_seconds_count"), counts["lag"] + 1
+        )
+        self.assertEqual(
+            get_sample("habit_reminder_duration_seconds_count", task),
+            counts["task"] + 1,
+        )
+        self.assertGreater(
+            get_sample("habit_reminder_db_queries_sum", task), counts["queries"]
+        )
+
+    def test_check_habits_coalesces_user_reminders(self):
+        """Тест на объединение напоминаний одного пользователя в одно сообщение"""
+        self.create_habit()
+        self.create_habit(action="Отжиматься", place="Дом")
+
+        with patch(
+            "habits.tasks.now", return_value=self.moment
+        ), self.patch_sender() as send:
+            check_habits()
+
+        send.assert_called_once_with(
+            [
+                (
+                    "Я буду Бегать в 07:30 в Парк\nЯ буду Отжиматься в 07:30 в Дом",
+                    "123456789",
+                )
+            ]
+        )
+
+    def test_check_habits_skips_users_without_chat_id(self):
+        """Тест на пропуск пользователей без Telegram ID"""
+        for tg_chat_id in (None, ""):
+            user = get_user_model().objects.create_user(
+                username=f"user-{tg_chat_id}",
+                password="12345678",
+                tg_chat_id=tg_chat_id,
+            )
+            self.create_habit(user=user)
+
+        with patch(
+            "habits.tasks.now", return_value=self.moment
+        ), self.patch_sender() as send:
+            check_habits()
+
+        send.assert_not_called()
+
+    def create_users_habits(self, count):
+        for i in range(count):
+            user = get_user_model().objects.create_user(
+                username=f"user-{i}", password="12345678", tg_chat_id=str(i)
+            )
+            self.create_habit(user=user)
+
+    def run_tick(self, moment):
+        with patch(
+            "habits.tasks.now", return_value=moment
+        ), self.patch_sender() as send:
+            result = check_habits()
+        return result, send
+
+    def test_deliver_reminders_query_count(self):
+        """Тест на постоянное число запросов на пакет независимо от количества привычек"""
+        self.create_users_habits(10)
+        delivery_ids = record_due_reminders(self.moment)
+
+        with self.patch_sender() as send, self.assertNumQueries(3):
+            result = deliver_reminders(delivery_ids)
+
+        self.assertEqual(len(send.call_args.args[0]), 10)
+        self.assertEqual(result["sent"], 10)
+        self.assertEqual(
+            ReminderDelivery.objects.filter(
+                status=ReminderDelivery.Status.SENT
+            ).count(),
+            10,
+        )
+
+    @override_settings(REMINDER_DELIVERY_CHUNK_SIZE=4)
+    def test_check_habits_fans_out_chunks(self):
+        """Тест на разбиение наступивших напоминаний на пакеты"""
+        self.create_users_habits(10)
+
+        result, send = self.run_tick(self.moment)
+
+        self.assertEqual(result, {"reminders": 10, "chunks": 3})
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(sum(len(call.args[0]) for call in send.call_args_list), 10)
+
+    def test_check_habits_runs_once_per_minute(self):
+        """Тест на отсутствие повторной отправки при повторном запуске в ту же минуту"""
+        self.create_habit()
+
+        self.run_tick(self.moment)
+        result, send = self.run_tick(self.moment + timedelta(seconds=30))
+
+        self.assertEqual(result["reminders"], 0)
+        send.assert_not_called()
+        self.assertEqual(ReminderDelivery.objects.count(), 1)
+
+    def test_check_habits_catches_up_after_downtime(self):
+        """Тест на отправку пропущенных за время простоя напоминаний"""
+        self.create_habit(time="07:27:00")
+        self.run_tick(self.moment - timedelta(minutes=5))
+
+        result, send = self.run_tick(self.moment)
+
+        self.assertEqual(result["reminders"], 1)
+        send.assert_called_once_with([("Я буду Бегать в 07:27 в Парк", "123456789")])
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(
+            delivery.scheduled_at, self.moment.replace(minute=27, second=0)
+        )
+        self.assertEqual(delivery.status, ReminderDelivery.Status.SENT)
+
+    def test_deliver_reminders_skips_sent(self):
+        """Тест на отсутствие повторной отправки уже доставленного напоминания"""
+        self.create_habit()
+        delivery_ids = record_due_reminders(self.moment)
+
+        with self.patch_sender():
+            deliver_reminders(delivery_ids)
+        with self.patch_sender() as send:
+            result = deliver_reminders(delivery_ids)
+
+        send.assert_called_once_with([])
+        self.assertEqual(result["sent"], 0)
+
+
+class ShardedCheckHabitsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.moment = datetime(2024, 12, 2, 7, 30, tzinfo=timezone.utc)
+        for i in range(12):
+            user = get_user_model().objects.create_user(
+                username=f"user-{i}",
+                password="12345678",
+                tg_chat_id=str(i),
+                timezone=["UTC", "Europe/Moscow", "Asia/Tokyo"][i % 3],
+            )
+            for hour in (7, 10, 16):
+                Habit.objects.create(
+                    user=user,
+                    place="Парк",
+                    time=f"{hour}:30:00",
+                    action="Бегать",
+                    duration=60,
+                )
+
+    def test_shards_cover_unsharded_result(self):
+        """Тест на совпадение объединения шардов с выборкой без шардирования"""
+        minutes = [self.moment - timedelta(minutes=1), self.moment]
+        unsharded = list(select_due_reminders(minutes))
+        shards = [set(select_due_reminders(minutes, shard, 4)) for shard in range(4)]
+
+        self.assertEqual(len(unsharded), 12)
+        self.assertEqual(set().union(*shards), set(unsharded))
+        self.assertEqual(sum(len(shard) for shard in shards), len(unsharded))
+
+    def test_shards_record_own_reminders(self):
+        """Тест на то, что каждый шард ставит в очередь только свои напоминания"""
+        delivery_ids = [
+            record_due_reminders(self.moment, shard, 3) for shard in range(3)
+        ]
+
+        self.assertEqual(sum(len(ids) for ids in delivery_ids), 12)
+        for shard, ids in enumerate(delivery_ids):
+            user_ids = ReminderDelivery.objects.filter(id__in=ids).values_list(
+                "habit__user_id", flat=True
+            )
+            self.assertTrue(all(user_id % 3 == shard for user_id in user_ids))
+
+    def test_shard_runs_once_per_minute(self):
+        """Тест на блокировку повторного запуска шарда в ту же минуту"""
+        with patch("habits.tasks.now", return_value=self.moment), patch(
+            "habits.tasks.record_due_reminders", return_value=[]
+        ) as record:
+            check_habits(1, 3)
+            result = check_habits(1, 3)
+            check_habits(2, 3)
+
+        self.assertTrue(result["skipped"])
+        self.assertEqual(record.call_count, 2)
+
+
+class UserTimezoneTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="user1",
+            password="12345678",
+            tg_chat_id="123456789",
+            timezone="Europe/Berlin",
+        )
+
+    def create_habit(self, time):
+        return Habit.objects.create(
+            user=self.user,
+            place="Парк",
+            time=time,
+            action="Бегать",
+            duration=60,
+            periodicity_type=Habit.Periodicity.DAILY,
+        )
+
+    def get_due(self, *args):
+        moment = datetime(*args, tzinfo=timezone.utc)
+        deliveries = ReminderDelivery.objects.filter(
+            id__in=record_due_reminders(moment)
+        )
+        due = list(deliveries.values_list("habit_id", "scheduled_at"))
+        # Напоминания считаются отправленными, чтобы не попасть в повторную отправку
+        deliveries.update(status=ReminderDelivery.Status.SENT)
+        return due
+
+    def test_local_time_across_dst(self):
+        """Тест на напоминание по местному времени зимой и летом"""
+        habit = self.create_habit("08:00:00")
+
+        self.assertEqual(
+            self.get_due(2024, 1, 15, 7, 0),
+            [(habit.id, datetime(2024, 1, 15, 7, 0, tzinfo=timezone.utc))],
+        )
+        self.assertEqual(self.get_due(2024, 1, 15, 8, 0), [])
+        self.assertEqual(
+            self.get_due(2024, 7, 15, 6, 0),
+            [(habit.id, datetime(2024, 7, 15, 6, 0, tzinfo=timezone.utc))],
+        )
+
+    def test_repeated_local_minute(self):
+        """Тест на однократное напоминание в повторяющийся при переводе часов час"""
+        habit = self.create_habit("02:30:00")
+
+        self.assertEqual(len(self.get_due(2024, 10, 27, 0, 30)), 1)
+        self.assertEqual(self.get_due(2024, 10, 27, 1, 30), [])
+        self.assertEqual(ReminderDelivery.objects.filter(habit=habit).count(), 1)
+
+    def test_skipped_local_minute(self):
+        """Тест на напоминание в пропущенный при переводе часов час сразу после перевода"""
+        habit = self.create_habit("02:30:00")
+        on_time = self.create_habit("03:00:00")
+
+        self.assertEqual(self.get_due(2024, 3, 31, 0, 59), [])
+        self.assertEqual(
+            sorted(self.get_due(2024, 3, 31, 1, 0)),
+            [
+                (habit.id, datetime(2024, 3, 31, 1, 0, tzinfo=timezone.utc)),
+                (on_time.id, datetime(2024, 3, 31, 1, 0, tzinfo=timezone.utc)),
+            ],
+        )
+        self.assertEqual(self.get_due(2024, 3, 31, 1, 30), [])
+
+    def test_timezone_change_moves_schedule(self):
+        """Тест на перенос расписания при смене часового пояса пользователя"""
+        habit = self.create_habit("08:00:00")
+        self.assertEqual(self.get_due(2024, 1, 15, 7, 0)[0][0], habit.id)
+
+        self.user.timezone = "Asia/Tokyo"
+        self.user.save()
+
+        self.assertEqual(
+            set(ReminderSlot.objects.values_list("timezone", flat=True)),
+            {"Asia/Tokyo"},
+        )
+        self.assertEqual(self.get_due(2024, 1, 15, 23, 0)[0][0], habit.id)
+
+    def test_get_local_slots(self):
+        """Тест на вычисление местных минут недели по часовым поясам"""
+        minute = datetime(2024, 12, 2, 7, 30, tzinfo=timezone.utc)
+
+        self.assertEqual(
+            get_local_slots([minute], ["UTC", "Asia/Tokyo"]),
+            {
+                ("UTC", get_slot(1, time(7, 30))): minute,
+                ("Asia/Tokyo", get_slot(1, time(16, 30))): minute,
+            },
+        )
+
+
+class ReminderScheduleTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user1", password="12345678"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.habit_data = {
+            "place": "Парк",
+            "time": "07:30:00",
+            "action": "Бегать",
+            "is_pleasant": False,
+            "duration": 60,
+            "is_public": True,
+            "periodicity_type": "WEEKLY",
+            "weekdays": [1, 3],
+            "reward": None,
+            "related_habit": None,
+        }
+
+    def get_slots(self, habit_id):
+        return set(
+            ReminderSlot.objects.filter(habit_id=habit_id).values_list(
+                "slot", flat=True
+            )
+        )
+
+    def test_get_slot(self):
+        """Тест на вычисление минуты недели"""
+        self.assertEqual(get_slot(1, time(0, 0)), 0)
+        self.assertEqual(get_slot(1, time(7, 30)), 450)
+        self.assertEqual(get_slot(7, time(23, 59)), 7 * 24 * 60 - 1)
+
+    def test_schedule_follows_habit_changes(self):
+        """Тест на обновление расписания при создании, изменении и удалении привычки"""
+        response = self.client.post("/habits/", self.habit_data, format="json")
+        habit_id = response.data["id"]
+        self.assertEqual(
+            self.get_slots(habit_id),
+            {get_slot(1, time(7, 30)), get_slot(3, time(7, 30))},
+        )
+
+        self.client.patch(
+            f"/habits/{habit_id}/",
+            {"periodicity_type": "DAILY", "weekdays": None, "time": "08:00:00"},
+            format="json",
+        )
+        self.assertEqual(
+            self.get_slots(habit_id), {get_slot(day, time(8, 0)) for day in range(1, 8)}
+        )
+
+        self.client.patch(f"/habits/{habit_id}/", {"is_pleasant": True}, format="json")
+        self.assertEqual(self.get_slots(habit_id), set())
+
+        self.client.patch(f"/habits/{habit_id}/", {"is_pleasant": False}, format="json")
+        self.client.delete(f"/habits/{habit_id}/")
+        self.assertFalse(ReminderSlot.objects.exists())
+
+    def test_rebuild_schedule_command(self):
+        """Тест на перестроение и сверку расписания командой"""
+        self.client.post("/habits/", self.habit_data, format="json")
+        ReminderSlot.objects.all().delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_schedule", "--check", stdout=StringIO())
+
+        call_command("rebuild_schedule", stdout=StringIO())
+        self.assertEqual(ReminderSlot.objects.count(), 2)
+        call_command("rebuild_schedule", "--check", stdout=StringIO())
+
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    """Заглушка Telegram Bot API: чат 400 получает ошибку, чат slow ждёт ответа"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        self.server.requests.append((self.path, body))
+        if "chat_id=slow" in body:
+            time_module.sleep(1)
+        status_code = 400 if "chat_id=400" in body else 200
+        payload = json.dumps({"ok": status_code == 200}).encode()
+        try:
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except ConnectionError:
+            # Клиент уже закрыл соединение по таймауту
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramSenderTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStubHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings_override = override_settings(
+            TELEGRAM_API_URL=f"http://127.0.0.1:{self.server.server_port}",
+            TELEGRAM_BOT_TOKEN="token",
+            TELEGRAM_TIMEOUT=0.5,
+            TELEGRAM_MAX_CONCURRENCY=4,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_send_batch(self):
+        """Тест на отправку пакета сообщений с результатом по каждому"""
+        messages = [(f"Сообщение {i}", str(i)) for i in range(10)]
+
+        results = send_telegram_messages(messages)
+
+        self.assertEqual(
+            [result.tg_chat_id for result in results], list(map(str, range(10)))
+        )
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(self.server.requests), 10)
+        self.assertEqual(self.server.requests[0][0], "/bottoken/sendMessage")
+
+    def test_client_reused_between_batches(self):
+        """Тест на общий HTTP-клиент для пакетов одного потока"""
+        with patch(
+            "habits.services.httpx.AsyncClient", wraps=httpx.AsyncClient
+        ) as client:
+            for _ in range(2):
+                send_telegram_messages([("Привет", "1")])
+
+        self.assertLessEqual(client.call_count, 1)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_send_batch_reports_failures(self):
+        """Тест на результаты с ошибкой ответа API и таймаутом"""
+        with self.assertLogs("habits.services", "WARNING") as logs:
+            results = send_telegram_messages(
+                [("Привет", "1"), ("Привет", "400"), ("Привет", "slow")]
+            )
+
+        self.assertEqual([result.ok for result in results], [True, False, False])
+        self.assertEqual(results[1].status_code, 400)
+        self.assertIsNone(results[2].status_code)
+        self.assertIn("Timeout", results[2].error)
+        self.assertEqual(len(logs.output), 2)
+
+
+@override_settings(TELEGRAM_GLOBAL_RATE=3, TELEGRAM_CHAT_INTERVAL=1)
+class TelegramRateLimitTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        time_patch = patch("habits.ratelimit.time", return_value=1000.5)
+        self.time = time_patch.start()
+        self.addCleanup(time_patch.stop)
+
+    def message(self, tg_chat_id):
+        return {
+            "text": "Привет",
+            "tg_chat_id": tg_chat_id,
+            "scheduled_at": 990.0,
+            "delivery_ids": [],
+        }
+
+    def test_chat_limit(self):
+        """Тест на ограничение одного сообщения в секунду на чат"""
+        self.assertEqual(acquire_send_slot("1"), 0)
+        self.assertEqual(acquire_send_slot("1"), 1)
+        self.assertEqual(acquire_send_slot("2"), 0)
+
+    def test_global_limit(self):
+        """Тест на общее ограничение числа сообщений в секунду"""
+        delays = [acquire_send_slot(str(i)) for i in range(5)]
+        self.assertEqual(delays, [0, 0, 0, 1, 1])
+
+        self.time.return_value = 1001.1
+        self.assertEqual(acquire_send_slot("3"), 0)
+
+    def test_global_limit_key_expired(self):
+        """Тест на повторное создание счётчика, истёкшего между add и incr"""
+        incr = cache.incr
+
+        def expire_once(key, delta=1):
+            if not calls:
+                calls.append(key)
+                cache.delete(key)
+            return incr(key, delta)
+
+        calls = []
+        with patch.object(cache, "incr", side_effect=expire_once):
+            self.assertEqual(acquire_send_slot("1"), 0)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get("telegram:global:1000"), 1)
+
+    def test_deliver_messages_requeues_deferred(self):
+        """Тест на повторную постановку в очередь отложенных сообщений и 429"""
+        messages = [self.message("1"), self.message("1"), self.message("2")]
+        results = [
+            DeliveryResult("1", True, 200),
+            DeliveryResult("2", False, 429, "Too Many Requests", retry_after=5),
+        ]
+
+        with patch("habits.tasks.send_telegram_messages", return_value=results), patch(
+            "habits.tasks.time", return_value=1000.5
+        ), patch.object(deliver_messages, "apply_async") as apply_async:
+            stats = deliver_messages(messages)
+
+        self.assertEqual(stats, {"sent": 1, "failed": 0, "deferred": 2})
+        apply_async.assert_any_call(([self.message("1")], True), countdown=1)
+        apply_async.assert_any_call(([self.message("2")], True), countdown=5)
+        self.assertEqual(acquire_send_slot("3"), 5)
+        self.assertEqual(
+            get_delivery_metrics(), {"queue_depth": 2, "delivery_lag": 10.5}
+        )
+
+
+class CoalesceMessagesTestCase(SimpleTestCase):
+    def message(self, text, tg_chat_id="1", delivery_ids=()):
+        return {
+            "text": text,
+            "tg_chat_id": tg_chat_id,
+            "scheduled_at": 0.0,
+            "delivery_ids": list(delivery_ids),
+        }
+
+    def test_coalesce_by_chat(self):
+        """Тест на объединение сообщений по чатам"""
+        messages = [
+            self.message("a", delivery_ids=[1]),
+            self.message("b", "2", delivery_ids=[2]),
+            self.message("c", delivery_ids=[3]),
+        ]
+
+        self.assertEqual(
+            coalesce_messages(messages),
+            [
+                self.message("a\nc", delivery_ids=[1, 3]),
+                self.message("b", "2", delivery_ids=[2]),
+            ],
+        )
+
+    def test_coalesce_splits_at_limit(self):
+        """Тест на разбиение объединённого сообщения по лимиту длины"""
+        messages = [
+            self.message("a" * 4),
+            self.message("b" * 4),
+            self.message("c" * 12),
+        ]
+
+        self.assertEqual(
+            coalesce_messages(messages, limit=10),
+            [
+                self.message("aaaa\nbbbb"),
+                dict(self.message("c" * 10), partial=True),
+                self.message("cc"),
+            ],
+        )
+
+    def test_coalesce_split_marks_partial(self):
+        """Тест, что части длинного текста, кроме последней, помечены partial"""
+        messages = [
+            self.message("a" * 4, delivery_ids=[1]),
+            self.message("c" * 12, delivery_ids=[2]),
+            self.message("d", delivery_ids=[3]),
+        ]
+
+        self.assertEqual(
+            coalesce_messages(messages, limit=10),
+            [
+                self.message("aaaa", delivery_ids=[1]),
+                dict(self.message("c" * 10, delivery_ids=[2]), partial=True),
+                self.message("cc\nd", delivery_ids=[2, 3]),
+            ],
+        )
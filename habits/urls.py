@@ -2,7 +2,9 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from habits.apps import HabitsConfig
-from habits.views import HabitViewSet, PublicListAPIView
+from habits.async_views import (AsyncHabitDetailView, AsyncHabitListView,
+                                AsyncPublicListView)
+from habits.views import HabitViewSet, PublicExportAPIView, PublicListAPIView
 
 app_name = HabitsConfig.name
 
@@ -10,5 +12,12 @@ router = DefaultRouter()
 router.register("", HabitViewSet, basename="habits")
 
 urlpatterns = [
-    path("public/", PublicListAPIView.as_view(), name="public_habits")
+    path("public/", PublicListAPIView.as_view(), name="public_habits"),
+    path("public/export/", PublicExportAPIView.as_view(), name="public_export"),
+    # Асинхронные версии для ASGI-сервера
+    path("async/", AsyncHabitListView.as_view(), name="async_habits"),
+    path(
+        "async/<int:pk>/", AsyncHabitDetailView.as_view(), name="async_habit_detail"
+    ),
+    path("async/public/", AsyncPublicListView.as_view(), name="async_public_habits"),
 ] + router.urls
@@ -1,13 +1,105 @@
-from rest_framework import generics, viewsets
+import codecs
+from pathlib import Path
 
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags
+from rest_framework import generics, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+
+from habit_reminder.routers import get_replica, get_user_key, reading_from
+from habits.export import EXPORT_CONTENT_TYPES, stream_habits
+from habits.feed_cache import (PUBLIC_STICKY_KEY, get_cached_page,
+                               get_page_key, get_public_version,
+                               set_cached_page)
+from habits.filters import HabitFilterBackend
+from habits.importer import IMPORT_FORMATS, import_habits, parse_habits
 from habits.models import Habit
+from habits.paginators import HabitCursorPagination
 from habits.permissions import IsOwner
-from habits.serializers import HabitSerializer
+from habits.serializers import HabitListSerializer, HabitSerializer, parse_id
+
+
+def is_not_modified(request, etag):
+    """Совпадает ли ETag с If-None-Match запроса"""
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    return etag in if_none_match or "*" in if_none_match
+
+
+def get_list_serializer(request):
+    """HabitListSerializer с полями из параметра fields"""
+    fields = request.query_params.get("fields", "")
+    return HabitListSerializer(
+        [field.strip() for field in fields.split(",") if field.strip()]
+    )
+
+
+class HabitListMixin:
+    """Список привычек без создания экземпляров модели
+
+    Строки берутся из values() и сериализуются HabitListSerializer. Параметр
+    fields ограничивает список полей в ответе и столбцов в запросе. Списки
+    читаются из реплики, если по get_sticky_keys() не было недавних записей.
+    """
+
+    filter_backends = (HabitFilterBackend,)
 
+    def get_list_serializer(self):
+        return get_list_serializer(self.request)
 
-class HabitViewSet(viewsets.ModelViewSet):
+    def get_sticky_keys(self):
+        """Ключи записей, после которых список читается из основной базы"""
+        return (get_user_key(self.request.user.id),)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_list_serializer()
+        columns = serializer.columns
+        if "id" not in columns:
+            # Курсор пагинации строится по id
+            columns += ("id",)
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        with reading_from(get_replica(*self.get_sticky_keys())):
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(serializer.serialize(page))
+            return Response(serializer.serialize(queryset))
+
+    def export(self, request):
+        """Потоковая выгрузка всех привычек списка в NDJSON или CSV
+
+        Строки читаются серверным курсором, поэтому память не зависит от
+        размера выгрузки. Фильтры и fields работают так же, как в списке.
+        """
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise serializers.ValidationError(
+                {"export_format": "Поддерживаются форматы ndjson и csv"}
+            )
+        serializer = self.get_list_serializer()
+        # Строки читаются уже после выхода из представления, поэтому база
+        # задаётся самому запросу
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .using(get_replica(*self.get_sticky_keys()))
+            .values(*serializer.columns)
+            .iterator(chunk_size=settings.HABITS_EXPORT_CHUNK_SIZE)
+        )
+        response = StreamingHttpResponse(
+            stream_habits(serializer.iterate(rows), serializer.fields, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="habits.{export_format}"'
+        )
+        return response
+
+
+class HabitViewSet(HabitListMixin, viewsets.ModelViewSet):
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
+    pagination_class = HabitCursorPagination
     permission_classes = (IsOwner,)
 
     def get_queryset(self):
@@ -16,7 +108,142 @@ class HabitViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        # Владелец уже известен, расписанию не нужно загружать его заново
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export_habits(self, request):
+        """Выгрузка привычек пользователя"""
+        return self.export(request)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=(MultiPartParser,),
+    )
+    def import_file(self, request):
+        """Импортирует привычки пользователя из файла NDJSON или CSV
+
+        Уже существующие привычки пропускаются и не обновляются.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise serializers.ValidationError({"file": "Загрузите файл с привычками"})
+        import_format = request.query_params.get("import_format") or (
+            Path(upload.name).suffix.lstrip(".").lower()
+        )
+        if import_format not in IMPORT_FORMATS:
+            raise serializers.ValidationError(
+                {"import_format": "Поддерживаются форматы ndjson и csv"}
+            )
+        lines = codecs.iterdecode(upload, "utf-8-sig")
+        result = import_habits(request.user, parse_habits(lines, import_format))
+        data = {
+            "created": result.created,
+            "skipped": result.skipped,
+            "rejected": [
+                {"line": number, "errors": errors} for number, errors in result.rejected
+            ],
+            "rows_per_second": round(result.rows_per_second, 1),
+        }
+        if result.error:
+            # Пачки, прочитанные до ошибки, уже загружены
+            return Response(
+                {"file": [result.error], **data}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(data)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """Создаёт несколько привычек одним запросом"""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @bulk_create.mapping.put
+    def bulk_update(self, request, partial=False):
+        """Обновляет несколько привычек одним запросом, элементы указывают id"""
+        data = request.data
+        if isinstance(data, list) and len(data) <= settings.HABITS_BULK_MAX_SIZE:
+            ids = [parse_id(item.get("id")) for item in data if isinstance(item, dict)]
+            queryset = self.get_queryset().filter(
+                id__in=[pk for pk in ids if pk is not None]
+            )
+        else:
+            # Тип и размер пачки проверит сериализатор, привычки не нужны
+            queryset = Habit.objects.none()
+        serializer = self.get_serializer(
+            queryset.select_related("user"),
+            data=request.data,
+            many=True,
+            partial=partial,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    @bulk_create.mapping.patch
+    def bulk_partial_update(self, request):
+        """Частично обновляет несколько привычек одним запросом"""
+        return self.bulk_update(request, partial=True)
+
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        """Удаляет несколько привычек по списку id"""
+        ids = serializers.ListField(
+            child=serializers.IntegerField(),
+            allow_empty=False,
+            max_length=settings.HABITS_BULK_MAX_SIZE,
+        ).run_validation(request.data)
+        queryset = self.get_queryset().filter(id__in=ids)
+        found = set(queryset.values_list("id", flat=True))
+        if len(found) < len(set(ids)):
+            raise serializers.ValidationError(
+                [{} if pk in found else {"id": "Привычка не найдена"} for pk in ids]
+            )
+        queryset.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PublicListAPIView(HabitListMixin, generics.ListAPIView):
+    """Лента публичных привычек
+
+    Страницы кэшируются по версии ленты, которая меняется при любом изменении
+    публичных привычек. Версия же служит ETag: при совпадении If-None-Match
+    клиент получает 304 без обращения к базе.
+    """
 
-class PublicListAPIView(generics.ListAPIView):
     queryset = Habit.public_habits.all()
     serializer_class = HabitSerializer
+    pagination_class = HabitCursorPagination
+
+    def get_sticky_keys(self):
+        return (PUBLIC_STICKY_KEY,)
+
+    def list(self, request, *args, **kwargs):
+        key = get_page_key(get_public_version(), request.build_absolute_uri())
+        etag = f'"{key}"'
+        if is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        data = get_cached_page(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            set_cached_page(key, data)
+        return Response(data, headers={"ETag": etag})
+
+
+class PublicExportAPIView(HabitListMixin, generics.GenericAPIView):
+    """Выгрузка ленты публичных привычек"""
+
+    queryset = Habit.public_habits.all()
+    serializer_class = HabitSerializer
+
+    def get_sticky_keys(self):
+        return (PUBLIC_STICKY_KEY,)
+
+    def get(self, request, *args, **kwargs):
+        return self.export(request)
@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (AuthenticationFailed,
+                                                 InvalidToken)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Пароль не кэшируется: у восстановленного из кэша пользователя он отложен
+# и при обращении загружается из базы, а save() его не перезаписывает
+CACHED_USER_FIELDS = (
+    "id",
+    "last_login",
+    "is_superuser",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_staff",
+    "is_active",
+    "date_joined",
+    "tg_chat_id",
+    "timezone",
+)
+
+
+class LocalUserCache:
+    """Небольшой LRU-кэш в памяти процесса с ограниченным временем жизни"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+local_users = LocalUserCache(
+    settings.AUTH_USER_LOCAL_CACHE_SIZE, settings.AUTH_USER_LOCAL_CACHE_TTL
+)
+
+
+def get_user_cache_key(user_id):
+    return f"users:auth:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Удаляет пользователя из кэшей аутентификации
+
+    Другие процессы сбрасывают свою копию по истечении
+    AUTH_USER_LOCAL_CACHE_TTL.
+    """
+    local_users.delete(str(user_id))
+    cache.delete(get_user_cache_key(user_id))
+
+
+def get_cached_values(user):
+    values = [getattr(user, field) for field in CACHED_USER_FIELDS]
+    if api_settings.CHECK_REVOKE_TOKEN:
+        values.append(get_md5_hash_password(user.password))
+    return values
+
+
+def build_user(values):
+    """Пользователь из закэшированных значений полей без запроса к базе"""
+    return get_user_model().from_db(
+        DEFAULT_DB_ALIAS, CACHED_USER_FIELDS, values[: len(CACHED_USER_FIELDS)]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация, которая берёт пользователя из кэша
+
+    Поля пользователя хранятся в LRU-кэше процесса на несколько секунд и в
+    общем кэше (Redis) дольше, поэтому в обычном случае запрос не обращается
+    к таблице пользователей. Изменение или удаление пользователя удаляет его
+    из кэшей.
+    """
+
+    def get_user_id(self, validated_token):
+        try:
+            return str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        values = local_users.get(user_id)
+        if values is None:
+            values = cache.get(get_user_cache_key(user_id))
+            if values is None:
+                user = super().get_user(validated_token)
+                values = get_cached_values(user)
+                cache.set(
+                    get_user_cache_key(user_id),
+                    values,
+                    timeout=settings.AUTH_USER_CACHE_TTL,
+                )
+            local_users.set(user_id, values)
+        return self.check_user(values, validated_token)
+
+    async def aauthenticate(self, request):
+        """Асинхронный вариант authenticate() для асинхронных представлений"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        values = local_users.get(user_id)
+        if values is None:
+            values = await cache.aget(get_user_cache_key(user_id))
+            if values is None:
+                try:
+                    user = await self.user_model.objects.aget(
+                        **{api_settings.USER_ID_FIELD: user_id}
+                    )
+                except self.user_model.DoesNotExist as e:
+                    raise AuthenticationFailed(
+                        _("User not found"), code="user_not_found"
+                    ) from e
+                values = get_cached_values(user)
+                await cache.aset(
+                    get_user_cache_key(user_id),
+                    values,
+                    timeout=settings.AUTH_USER_CACHE_TTL,
+                )
+            local_users.set(user_id, values)
+        return self.check_user(values, validated_token)
+
+    def check_user(self, values, validated_token):
+        user = build_user(values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if (
+            api_settings.CHECK_REVOKE_TOKEN
+            and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            != values[len(CACHED_USER_FIELDS)]
+        ):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
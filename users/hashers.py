@@ -0,0 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_executor = None
+_executor_lock = Lock()
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 с параметрами стоимости из настроек
+
+    При изменении параметров must_update() возвращает True, и пароль
+    перехешируется с новыми параметрами при следующем входе пользователя.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+def get_executor():
+    """Пул потоков для хеширования паролей, общий для процесса
+
+    argon2-cffi и hashlib отпускают GIL на время вычисления, поэтому потоки
+    считают хеши параллельно, а размер пула ограничивает нагрузку на CPU.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS,
+                    thread_name_prefix="password-hashing",
+                )
+    return _executor
+
+
+def make_password(password):
+    """Хеширует пароль в пуле"""
+    return get_executor().submit(hashers.make_password, password).result()
+
+
+def verify_password(password, encoded):
+    """Проверяет пароль в пуле: (пароль верен, нужно перехешировать)"""
+    return get_executor().submit(hashers.verify_password, password, encoded).result()
+
+
+async def amake_password(password):
+    """Хеширует пароль в пуле, не блокируя цикл событий"""
+    return await asyncio.wrap_future(
+        get_executor().submit(hashers.make_password, password)
+    )
+
+
+async def averify_password(password, encoded):
+    """Проверяет пароль в пуле, не блокируя цикл событий"""
+    return await asyncio.wrap_future(
+        get_executor().submit(hashers.verify_password, password, encoded)
+    )
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+import users.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_tg_chat_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="timezone",
+            field=models.CharField(
+                default="UTC",
+                max_length=64,
+                validators=[users.validators.validate_timezone],
+                verbose_name="Часовой пояс",
+            ),
+        ),
+    ]
@@ -1,8 +1,44 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from users.hashers import (amake_password, averify_password, make_password,
+                           verify_password)
+from users.validators import validate_timezone
+
 
 class User(AbstractUser):
     tg_chat_id = models.CharField(
         max_length=50, verbose_name="Telegram ID", blank=True, null=True
     )
+    timezone = models.CharField(
+        max_length=64,
+        default="UTC",
+        validators=[validate_timezone],
+        verbose_name="Часовой пояс",
+    )
+
+    def set_password(self, raw_password):
+        self.password = make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """Проверяет пароль в пуле хеширования и обновляет устаревший хеш"""
+        is_correct, must_update = verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.set_password(raw_password)
+            # Обновление хеша не считается сменой пароля
+            self._password = None
+            self.save(update_fields=["password"])
+        return is_correct
+
+    async def aset_password(self, raw_password):
+        self.password = await amake_password(raw_password)
+        self._password = raw_password
+
+    async def acheck_password(self, raw_password):
+        is_correct, must_update = await averify_password(raw_password, self.password)
+        if is_correct and must_update:
+            await self.aset_password(raw_password)
+            self._password = None
+            await self.asave(update_fields=["password"])
+        return is_correct
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from users.hashers import make_password
 from users.models import User
 
 
@@ -8,3 +9,9 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = "__all__"
+        extra_kwargs = {"password": {"write_only": True}}
+
+    def create(self, validated_data):
+        # Хеш считается один раз до INSERT, повторное сохранение не нужно
+        validated_data["password"] = make_password(validated_data["password"])
+        return super().create(validated_data)
@@ -0,0 +1,21 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from users.authentication import invalidate_user
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """Сбрасывает кэш аутентификации при изменении или удалении пользователя
+
+    Повторно после коммита, чтобы запрос, прочитавший старые данные до
+    коммита, не оставил их в кэше.
+    """
+    user_id = getattr(instance, api_settings.USER_ID_FIELD)
+    invalidate_user(user_id)
+    transaction.on_commit(partial(invalidate_user, user_id))
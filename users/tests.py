@@ -1,6 +1,13 @@
-from django.contrib.auth import get_user_model
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model, hashers
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.authentication import CachedJWTAuthentication, local_users
 
 
 class UserCreateAPIViewTestCase(APITestCase):
@@ -29,3 +36,134 @@ class UserCreateAPIViewTestCase(APITestCase):
         response = self.client.post("/auth/register/", data, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_user_with_unknown_timezone(self):
+        """Тест на создание пользователя с неизвестным часовым поясом"""
+        data = {**self.data, "timezone": "Mars/Olympus"}
+        response = self.client.post("/auth/register/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("timezone", response.data)
+
+    def test_create_user_queries(self):
+        """Тест на создание пользователя одним INSERT без хеша в ответе"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/auth/register/", self.data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("password", response.data)
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertEqual(statements.count("INSERT"), 1)
+        self.assertNotIn("UPDATE", statements)
+        user = get_user_model().objects.get(username="user1")
+        self.assertTrue(user.password.startswith("argon2$"))
+
+
+class PasswordHashingTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            username="user",
+            password=hashers.make_password("12345678", hasher="pbkdf2_sha256"),
+        )
+
+    def login(self, password="12345678"):
+        return self.client.post(
+            "/auth/login/",
+            {"username": "user", "password": password},
+            format="json",
+        )
+
+    def test_rehash_on_login(self):
+        """Тест на перехеширование старого хеша при входе"""
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+        self.assertTrue(self.user.check_password("12345678"))
+
+    def test_wrong_password(self):
+        """Тест на вход с неверным паролем без перехеширования"""
+        response = self.login("87654321")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+    def test_rehash_on_changed_cost(self):
+        """Тест на перехеширование при изменении параметров Argon2"""
+        self.user.set_password("12345678")
+        self.user.save()
+
+        with self.settings(ARGON2_TIME_COST=3):
+            self.assertTrue(self.user.check_password("12345678"))
+
+        self.user.refresh_from_db()
+        hasher = hashers.identify_hasher(self.user.password)
+        self.assertEqual(hasher.decode(self.user.password)["time_cost"], 3)
+
+    def test_async_check_password(self):
+        """Тест на асинхронную проверку пароля в пуле хеширования"""
+        self.assertFalse(async_to_sync(self.user.acheck_password)("87654321"))
+        self.assertTrue(async_to_sync(self.user.acheck_password)("12345678"))
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = get_user_model().objects.create_user(
+            username="user1", password="12345678", tg_chat_id="123456789"
+        )
+        token = RefreshToken.for_user(self.user).access_token
+        self.authorization = f"Bearer {token}"
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+    def test_user_is_cached(self):
+        """Тест, что повторный запрос не читает пользователя из базы"""
+        response = self.client.get("/habits/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/habits/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        local_users.clear()
+        with self.assertNumQueries(1):
+            self.client.get("/habits/")
+
+    def test_cached_user(self):
+        """Тест, что пользователь из кэша совпадает с пользователем из базы"""
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=self.authorization)
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate(request)
+
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate(request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.tg_chat_id, "123456789")
+        self.assertFalse(user._state.adding)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("12345678"))
+
+    def test_deactivated_user(self):
+        """Тест, что деактивированный пользователь сразу теряет доступ"""
+        self.client.get("/habits/")
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get("/habits/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_changed_user(self):
+        """Тест, что изменения пользователя сбрасывают кэш"""
+        self.client.get("/habits/")
+
+        self.user.tg_chat_id = "987654321"
+        self.user.save()
+
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=self.authorization)
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        self.assertEqual(user.tg_chat_id, "987654321")
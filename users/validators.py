@@ -0,0 +1,15 @@
+from functools import lru_cache
+from zoneinfo import available_timezones
+
+from django.core.exceptions import ValidationError
+
+
+@lru_cache(maxsize=None)
+def get_timezones():
+    """Часовые пояса из базы tzdata, читается один раз за процесс"""
+    return frozenset(available_timezones())
+
+
+def validate_timezone(value):
+    if value not in get_timezones():
+        raise ValidationError(f"Неизвестный часовой пояс: {value}")
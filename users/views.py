@@ -11,6 +11,4 @@ class UserCreateAPIView(generics.CreateAPIView):
     permission_classes = (AllowAny,)
 
     def perform_create(self, serializer):
-        user = serializer.save(is_active=True)
-        user.set_password(self.request.data.get("password"))
-        user.save()
+        serializer.save(is_active=True)